@@ -0,0 +1,104 @@
+#-------------------------------------------------------------------------------
+# Name:        autocomplete
+# Purpose:     Suggests departments, courses and professors that start with
+#              what the user has typed so far. Every suggestion is read from
+#              resources.ui_lists once, into one sorted list of lowercase
+#              keys per kind, and each lookup is a binary search for the
+#              first key with the typed prefix.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/12/2018
+#-------------------------------------------------------------------------------
+
+import bisect
+import functools
+
+import resources
+
+KINDS = ('dept', 'course', 'prof')
+LIMIT = 10
+MAX_LIMIT = 50
+
+
+def _normalize(text):
+    '''
+    Lowercases text and collapses runs of whitespace, for keys and prefixes
+    '''
+    return ' '.join(text.lower().split())
+
+
+def _suggestions():
+    '''
+    Returns a dictionary mapping each of KINDS to a list of
+    (keys, label, fields) for every suggestion of that kind, where fields
+    holds the search form fields the suggestion fills in
+    '''
+    lists = resources.ui_lists()
+    suggestions = {kind: [] for kind in KINDS}
+
+    for dept in lists.depts:
+        name = lists.dept_names.get(dept, '')
+        suggestions['dept'].append(([dept, name],
+            '{} {}'.format(dept, name).strip(), (('dept', dept),)))
+
+    for dept, num, name in lists.courses:
+        code = '{} {}'.format(dept, num)
+        suggestions['course'].append(([code, name, num],
+            '{} {}'.format(code, name),
+            (('dept', dept), ('course_num', num), ('course_name', name))))
+
+    for fn, ln in lists.profs:
+        full_name = '{} {}'.format(fn, ln)
+        suggestions['prof'].append(([full_name, ln], full_name,
+            (('prof_fn', fn), ('prof_ln', ln))))
+
+    return suggestions
+
+
+@functools.lru_cache(maxsize = None)
+def _index(kind):
+    '''
+    Returns the prefix index for one of KINDS as a tuple of sorted keys and
+    a tuple of the (label, fields) suggestion for each key. A suggestion
+    appears once for each of its keys. Built on first use and then kept.
+    '''
+    entries = sorted((_normalize(key), label, fields)
+                     for keys, label, fields in _suggestions()[kind]
+                     for key in keys if key)
+    return (tuple(key for key, label, fields in entries),
+            tuple((label, fields) for key, label, fields in entries))
+
+
+def suggest(text, kind = None, limit = LIMIT):
+    '''
+    Returns up to limit suggestions whose department code or name, course
+    code, number or name, or professor full or last name starts with text,
+    ignoring case. Each is a dictionary with the suggestion's kind, a label
+    to show and the search form fields it fills in. kind restricts the
+    suggestions to one of KINDS; otherwise departments come first, then
+    courses, then professors.
+
+    Raises ValueError for an unknown kind or a limit outside 1 to MAX_LIMIT
+    '''
+    if kind is not None and kind not in KINDS:
+        raise ValueError('Unknown kind {!r}'.format(kind))
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError('limit must be between 1 and {}'.format(MAX_LIMIT))
+
+    prefix = _normalize(text)
+    if not prefix:
+        return []
+
+    found = []
+    for k in ([kind] if kind else KINDS):
+        keys, entries = _index(k)
+        seen = set()
+        i = bisect.bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix) and len(found) < limit:
+            label, fields = entries[i]
+            if label not in seen:
+                seen.add(label)
+                found.append(dict(fields, kind = k, label = label))
+            i += 1
+    return found
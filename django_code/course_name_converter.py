@@ -3,7 +3,10 @@
 # Purpose:     Given a department code and course name, queries the sql 
 #              database to find the number of the course. If the given 
 #              combination of dept and course name does not exist, the course 
-#              does not exist and convert_course_name_to_course_num returns None.
+#              in dept with the most similar name is used instead, and if no 
+#              name is close enough convert_course_name_to_course_num returns 
+#              None. The name of the course found is returned with its 
+#              number, so the page can say when it is not the one typed.
 #              The code to generate word clouds and graphs uses course_num, so 
 #              this helper function simplifies the output generation process.
 #
@@ -13,25 +16,29 @@
 #-------------------------------------------------------------------------------
 
 
-import sqlite3
-import os
-
-# Use this filename for the database
-DATA_DIR = os.path.dirname(__file__)
-DATABASE_FILENAME = os.path.join(DATA_DIR, 'reevaluations.db')
+import db_pool
+import queries
+import fuzzy
 
 
 def convert_course_name_to_course_num(dept, course_name):
     '''
-    If a user inputs a course_name, convert it to a course_num for the word cloud and graph code
+    If a user inputs a course_name, convert it to a course_num for the word cloud and graph code.
+    Returns (course_num, course_name), with the course number as a string and the
+    name of the course it belongs to, or (None, None) if there is no such course
     '''
-    db = sqlite3.connect(DATABASE_FILENAME)
-    c = db.cursor()
-    r = c.execute("SELECT DISTINCT course_number FROM courses \
-        WHERE dept = ? AND course = ?", (dept, course_name))
-    course_num = list(r.fetchall()) # list of tuples
+    with db_pool.connection() as db:
+        course_num = queries.read_rows(db, queries.COURSE_NAME_TO_NUM,
+            {'dept': dept, 'course_name': course_name}) # list of tuples
     if len(course_num) > 0:
-        return course_num[0][0] # only return the first result, in the rare case 
-        # the course went through a number change
-    else:
-        return None # the user inputted a dept and course name pair that isn't valid
+        # only return the first result, in the rare case the course went 
+        # through a number change. course_number may be stored as an 
+        # integer, but course numbers are looked up as strings everywhere 
+        # else, as the search form gives them
+        return str(course_num[0][0]), course_name
+    # the user inputted a dept and course name pair that isn't valid, so look
+    # for a misspelled or partial name
+    match = fuzzy.match_course_name(dept, course_name)
+    if match is not None:
+        return match[1], match[2]
+    return None, None
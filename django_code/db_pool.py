@@ -0,0 +1,114 @@
+#-------------------------------------------------------------------------------
+# Name:        db_pool
+# Purpose:     Keeps a small pool of read-only sqlite connections to the
+#              evaluations database so that each web request borrows an
+#              already open connection instead of opening (and leaking) a
+#              new one.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/10/2018
+#-------------------------------------------------------------------------------
+
+import sqlite3
+import os
+import queue
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+# Use this filename for the database
+DATA_DIR = os.path.dirname(__file__)
+DATABASE_FILENAME = os.path.join(DATA_DIR, 'reevaluations.db')
+
+# The web tier never writes to the database, and tosql.py is only rerun (or
+# evaluations inserted, followed by tosql.finish_build) while the server is
+# down, so sqlite can skip locking and change detection. Set to False if the
+# database may be changed underneath a running server.
+IMMUTABLE = True
+
+POOL_SIZE = 8
+CACHE_SIZE_KIB = 64 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+# compiled statements kept per connection, keyed by the SQL text
+STATEMENT_CACHE_SIZE = 64
+
+_idle = queue.LifoQueue(maxsize = POOL_SIZE)
+
+
+def _database_uri():
+    '''
+    Build the read-only URI used to open the database
+    '''
+    uri = 'file:{}?mode=ro'.format(pathname2url(os.path.abspath(DATABASE_FILENAME)))
+    if IMMUTABLE:
+        uri += '&immutable=1'
+    return uri
+
+
+def _connect():
+    '''
+    Open a new read-only connection with tuned pragmas
+    '''
+    # connections are handed between the server's threads, but only ever
+    # used by one thread at a time
+    db = sqlite3.connect(_database_uri(), uri = True, check_same_thread = False,
+        cached_statements = STATEMENT_CACHE_SIZE)
+    db.execute('PRAGMA query_only = ON;')
+    db.execute('PRAGMA cache_size = -{:d};'.format(CACHE_SIZE_KIB))
+    db.execute('PRAGMA mmap_size = {:d};'.format(MMAP_SIZE))
+    return db
+
+
+@contextmanager
+def connection():
+    '''
+    Borrow a connection from the pool for the duration of a with block:
+
+      with db_pool.connection() as db:
+          df = pd.read_sql_query(query, db)
+
+    The connection goes back to the pool afterwards, or is closed if the
+    pool is already full.
+    '''
+    try:
+        db = _idle.get_nowait()
+    except queue.Empty:
+        db = _connect()
+
+    try:
+        yield db
+    finally:
+        try:
+            _idle.put_nowait(db)
+        except queue.Full:
+            db.close()
+
+
+def data_version():
+    '''
+    Returns a string that changes whenever the database file is rebuilt, for
+    use in cache keys
+    '''
+    st = os.stat(DATABASE_FILENAME)
+    return '{}-{}'.format(st.st_mtime_ns, st.st_size)
+
+
+def build_version():
+    '''
+    Returns the user_version that tosql.py stamps on the database when it
+    builds it, or 0 if it was not stamped
+    '''
+    with connection() as db:
+        return db.execute('PRAGMA user_version;').fetchone()[0]
+
+
+def close_all():
+    '''
+    Close every idle connection in the pool
+    '''
+    while True:
+        try:
+            db = _idle.get_nowait()
+        except queue.Empty:
+            break
+        db.close()
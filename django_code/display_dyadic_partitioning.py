@@ -1,49 +1,63 @@
 import courses
 import pandas as pd
 
+# the label columns read by avg_generator
+COLUMNS = ('would_recommend', 'would_like_inst')
 
-def display_dyadic_partitioning(args):
+
+def display_dyadic_partitioning(args, results = None):
+    '''
+    Returns the sentences describing how many students liked the instructor and
+    would recommend the course or professor. results may hold what
+    courses.find_courses already returned for args.
+    '''
+    if results is None:
+        results = courses.find_courses(args, COLUMNS, arrays = True)
     if len(args) == 2:
         if 'prof_fn' in args and 'prof_ln' in args:
-            return prof_display(args)
+            return prof_display(args, results)
         elif 'dept' in args:
-            return course_display(args)
+            return course_display(args, results)
     else:
-        return course_and_prof_display(args)
+        return course_and_prof_display(args, results)
 
 
 def avg_generator(df):
-    would_recommend = pd.factorize(df.would_recommend)[0]
+    '''
+    Takes a dictionary of label arrays (or a DataFrame) from find_courses and
+    returns the share of positive would_recommend and would_like_inst labels
+    '''
+    would_recommend = pd.factorize(df['would_recommend'])[0]
     would_recommend = would_recommend[would_recommend != -1]
     would_recommend = 1 - would_recommend.mean()
-    would_like_inst = pd.factorize(df.would_like_inst)[0]
+    would_like_inst = pd.factorize(df['would_like_inst'])[0]
     would_like_inst = would_like_inst[would_like_inst != -1]
     would_like_inst = 1 - would_like_inst.mean()
     return would_recommend, would_like_inst
 
 
 
-def course_display(args):
+def course_display(args, results):
     course_name = args['dept'] + " " + args['course_num']
-    course_df, dept_df = courses.find_courses(args)
+    course_df, dept_df = results
     would_recommend, would_like_inst = avg_generator(course_df)
     would_recommend_str = "{:.2%}".format(would_recommend) + " of students of " + course_name + " would recommend it."
     would_like_str = "{:.2%}".format(would_like_inst) + " of students of " + course_name + " felt positively about their instructor."
     return would_like_str, would_recommend_str
 
 
-def prof_display(args):
+def prof_display(args, results):
     prof_name = args['prof_fn'] + " " + args['prof_ln']
-    prof_df, dept_df, primary_dept = courses.find_courses(args)
+    prof_df, dept_df, primary_dept = results
     would_recommend, would_like_inst = avg_generator(prof_df)
     would_recommend_str = "{:.2%}".format(would_recommend) + " of students taught by " + prof_name + " would recommend this professor overall."
     would_like_str = "{:.2%}".format(would_like_inst) + " of students taught by " + prof_name + " felt positively about their instructor."
     return would_like_str, would_recommend_str
     
 
-def course_and_prof_display(args):
+def course_and_prof_display(args, results):
     course_name = args['dept'] + " " + args['course_num']
-    course_and_prof_df, dept_df, course_df, prof_df = courses.find_courses(args)
+    course_and_prof_df, dept_df, course_df, prof_df = results
     prof_name = args['prof_fn'] + " " + args['prof_ln']
     would_recommend, would_like_inst = avg_generator(course_and_prof_df)
     would_recommend_str = "{:.2%}".format(would_recommend) + " of students who took " + course_name + " taught by " + prof_name + " would recommend it overall."
@@ -0,0 +1,133 @@
+#-------------------------------------------------------------------------------
+# Name:        fuzzy
+# Purpose:     Finds the courses and professors whose names are closest to a
+#              misspelled or partial name. Every name is split into
+#              trigrams (runs of three characters of a padded word) once, and
+#              a lookup scores only the names that share a trigram with what
+#              was typed, by the share of trigrams the two have in common.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/12/2018
+#-------------------------------------------------------------------------------
+
+import functools
+import re
+from collections import Counter
+
+import resources
+
+KINDS = ('course', 'prof')
+
+# names scoring below this are not offered as matches
+THRESHOLD = 0.3
+LIMIT = 5
+
+WORD_RE = re.compile(r'[^\W_]+')
+
+
+def trigrams(text):
+    '''
+    Returns the set of trigrams of the lowercased words in text. Apostrophes
+    are dropped, so "D'Arcy" and "Darcy" are the same word. Each word is
+    padded with two spaces in front and one behind, so short words and word
+    beginnings still make trigrams.
+    '''
+    grams = set()
+    for word in WORD_RE.findall(text.lower().replace("'", '')):
+        padded = '  {} '.format(word)
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _names(kind):
+    '''
+    Returns a list of (name, value) for every course or professor, where
+    value is (dept, course_num, course_name) or (fn, ln)
+    '''
+    lists = resources.ui_lists()
+    if kind == 'course':
+        return [(course[2], course) for course in lists.courses]
+    return [('{} {}'.format(fn, ln), (fn, ln)) for fn, ln in lists.profs]
+
+
+@functools.lru_cache(maxsize = None)
+def _index(kind):
+    '''
+    Returns the trigram index for one of KINDS: a tuple of values, a tuple
+    of each value's trigram count and a dictionary mapping each trigram to
+    a tuple of the positions of the values that have it. Built on first use
+    and then kept.
+    '''
+    values = []
+    sizes = []
+    postings = {}
+    for name, value in _names(kind):
+        grams = trigrams(name)
+        if not grams:
+            continue
+        for gram in grams:
+            postings.setdefault(gram, []).append(len(values))
+        values.append(value)
+        sizes.append(len(grams))
+    return (tuple(values), tuple(sizes),
+            {gram: tuple(positions) for gram, positions in postings.items()})
+
+
+@functools.lru_cache(maxsize = None)
+def _known(kind):
+    '''
+    Returns the values of the trigram index for kind as a frozenset, to tell
+    an exact name from one that needs matching
+    '''
+    return frozenset(_index(kind)[0])
+
+
+def search(kind, text, limit = LIMIT, threshold = THRESHOLD, keep = None):
+    '''
+    Returns up to limit (score, value) pairs for the courses or professors
+    whose names are most similar to text, best first. score is the number
+    of shared trigrams over the number of trigrams in either name, from 0
+    to 1. keep, if given, is called with each value and only values it
+    returns True for are considered.
+
+    Raises ValueError for an unknown kind
+    '''
+    if kind not in KINDS:
+        raise ValueError('Unknown kind {!r}'.format(kind))
+
+    values, sizes, postings = _index(kind)
+    grams = trigrams(text)
+    shared = Counter()
+    for gram in grams:
+        shared.update(postings.get(gram, ()))
+
+    found = []
+    for position, common in shared.items():
+        score = common / (len(grams) + sizes[position] - common)
+        if score >= threshold and (keep is None or keep(values[position])):
+            found.append((score, values[position]))
+    found.sort(key = lambda match: -match[0])
+    return found[:limit]
+
+
+def match_course_name(dept, course_name):
+    '''
+    Returns the (dept, course_num, course_name) of the course in dept whose
+    name is most similar to course_name, or None if none is close enough
+    '''
+    found = search('course', course_name, limit = 1,
+                   keep = lambda value: value[0] == dept)
+    return found[0][1] if found else None
+
+
+def match_prof(prof_fn, prof_ln):
+    '''
+    Returns (fn, ln) as stored in the database for the professor with the
+    given first and last name, or for the professor whose full name is most
+    similar to it, or None if none is close enough
+    '''
+    if (prof_fn, prof_ln) in _known('prof'):
+        return prof_fn, prof_ln
+    found = search('prof', '{} {}'.format(prof_fn, prof_ln), limit = 1)
+    return found[0][1] if found else None
@@ -10,22 +10,23 @@
 # Created:     03/04/2018
 #-------------------------------------------------------------------------------
 
-import sqlite3
-import os
-import pandas as pd
+from io import BytesIO
 from wordcloud import WordCloud
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import graphs
-from statistics import mode
+import db_pool
+import image_cache
+import queries
 
-# Use this filename for the database
-DATA_DIR = os.path.dirname(__file__)
-DATABASE_FILENAME = os.path.join(DATA_DIR, 'reevaluations.db')
 
+# as many words as WordCloud draws by default
+MAX_WORDS = 200
 
-def get_wc(args_from_ui):
+# cloud sizes in pixels. The search page shows 'low', which lays out in
+# about a quarter of the time, and links to 'high' for a closer look.
+RESOLUTIONS = {'low': (1000, 350), 'high': (2000, 700)}
+DEFAULT_RESOLUTION = 'low'
+
+
+def get_wc(args_from_ui, freqs = None, resolution = DEFAULT_RESOLUTION):
     '''
     Takes a dictionary containing search criteria and returns a 
     wordcloud based on the text responses for the matching
@@ -36,65 +37,90 @@ def get_wc(args_from_ui):
       - prof_fn is a string
       - prof_ln is a string
 
-    Doesn't return anything,  but rather saves the Wordcloud object 
-    into the 'static' folder
+    freqs may hold what get_wc_freqs already returned for args_from_ui.
+    resolution is one of the keys of RESOLUTIONS.
+
+    Returns the rendered Wordcloud as PNG bytes. Clouds are kept in 
+    image_cache, so they survive a server restart and can be made ahead of 
+    time by warm_wordclouds.py, and are read from there if they were 
+    rendered before
+    '''
+    key = cache_key(args_from_ui, resolution)
+    png = image_cache.get(key)
+    if png is not None:
+        return png
+
+    if freqs is None:
+        freqs = get_wc_freqs(args_from_ui)
+
+    png = render_wc(freqs, resolution)
+    image_cache.put(key, png)
+    return png
+
+
+def render_wc(freqs, resolution = DEFAULT_RESOLUTION):
+    '''
+    Lays out a Wordcloud of the given word frequencies at the given
+    resolution and returns it as PNG bytes. The cloud is saved straight from
+    its own image rather than drawn again through matplotlib.
+    Raises ValueError for an unknown resolution or if freqs is empty.
+    '''
+    if resolution not in RESOLUTIONS:
+        raise ValueError('Unknown word cloud resolution {!r}'.format(resolution))
+    width, height = RESOLUTIONS[resolution]
+
+    wc = WordCloud(width = width, height = height,
+        max_words = MAX_WORDS).generate_from_frequencies(freqs)
+
+    buf = BytesIO()
+    wc.to_image().save(buf, format = 'png')
+    return buf.getvalue()
+
+
+# the searches a word cloud can be made for, as sets of search arguments,
+# with the kind of search and the word cloud query for each
+WC_SEARCHES = [({'dept', 'course_num'}, 'course_num', queries.WC_COURSE_NUM),
+               ({'dept', 'course_name'}, 'course_name', queries.WC_COURSE_NAME),
+               ({'dept', 'course_num', 'prof_fn', 'prof_ln'}, 'course_num_and_prof',
+                queries.WC_COURSE_NUM_AND_PROF),
+               ({'dept', 'course_name', 'prof_fn', 'prof_ln'}, 'course_name_and_prof',
+                queries.WC_COURSE_NAME_AND_PROF),
+               ({'prof_fn', 'prof_ln'}, 'prof', queries.WC_PROF)]
+
+
+def wc_query(args_from_ui):
+    '''
+    Takes a dictionary containing search criteria and returns the kind of
+    search as a string and the word cloud query to run for it.
+    Raises ValueError if the criteria are not one of WC_SEARCHES
+    '''
+    for fields, kind, query in WC_SEARCHES:
+        if set(args_from_ui) == fields:
+            return kind, query
+    raise ValueError('Cannot make a word cloud for a search by {}'
+        .format(', '.join(sorted(args_from_ui)) or 'nothing'))
+
+
+def get_wc_freqs(args_from_ui):
+    '''
+    Takes a dictionary containing search criteria and returns a dictionary
+    mapping the most common words in the text responses for the matching
+    criteria to how many times they appear
+    '''
+    kind, query = wc_query(args_from_ui)
+    params = dict(args_from_ui, max_words = MAX_WORDS)
+    with db_pool.connection() as db:
+        return dict(queries.read_rows(db, query, params))
+
+
+def cache_key(args_from_ui, resolution = DEFAULT_RESOLUTION):
+    '''
+    Returns the image_cache key of the word cloud for the given search
+    criteria at the given resolution. At DEFAULT_RESOLUTION it is the key
+    the search page's word cloud is stored under by render_pipeline.
+    Raises ValueError if the criteria are not one of WC_SEARCHES
     '''
-    if not args_from_ui:
-        pass
-
-    db = sqlite3.connect(DATABASE_FILENAME)
-
-    if 'dept' in args_from_ui and 'course_num' in args_from_ui and len(args_from_ui) == 2:
-        query = 'SELECT text.course_id, text.course_resp FROM text JOIN courses ON \
-        text.course_id = courses.course_id WHERE courses.dept = "' + args_from_ui['dept'] +\
-        '" AND courses.course_number = "' + args_from_ui['course_num'] + '";'
-
-        evals_df = pd.read_sql_query(query, db)
-        evals = list(evals_df['course_resp'])
-
-    elif 'dept' in args_from_ui and 'course_name' in args_from_ui and len(args_from_ui) == 2:
-        query = 'SELECT text.course_id, text.course_resp FROM text JOIN courses ON \
-        text.course_id = courses.course_id WHERE courses.dept = "' + args_from_ui['dept'] +\
-        '" AND courses.course = "' + args_from_ui['course_name'] + '";'
-
-        evals_df = pd.read_sql_query(query, db)
-        evals = list(evals_df['course_resp'])
-
-    elif len(args_from_ui) == 4:
-        if 'course_num' in args_from_ui:
-            query = "SELECT text.course_id, course_resp, inst_resp FROM text JOIN \
-            courses JOIN profs ON text.course_id = courses.course_id AND text.course_id = \
-            profs.course_id WHERE courses.dept = '{}' AND \
-            courses.course_number = '{}' AND profs.fn = \
-            '{}' AND profs.ln = '{}';".format(args_from_ui['dept'], \
-            args_from_ui['course_num'], args_from_ui['prof_fn'], args_from_ui['prof_ln'])
-
-        elif 'course_name' in args_from_ui:
-            query = "SELECT text.course_id, course_resp, inst_resp FROM text JOIN \
-            courses JOIN profs ON text.course_id = courses.course_id AND text.course_id = \
-            profs.course_id WHERE courses.dept = '{}' AND \
-            courses.course = '{}' AND profs.fn = \
-            '{}' AND profs.ln = '{}';".format(args_from_ui['dept'], \
-            args_from_ui['course_name'], args_from_ui['prof_fn'], args_from_ui['prof_ln'])
-
-        evals_df = pd.read_sql_query(query, db)
-        evals = list(evals_df['course_resp']) + list(evals_df['inst_resp'])
-
-    else:
-        query = "SELECT text.course_id, text.inst_resp FROM text JOIN profs ON \
-        text.course_id = profs.course_id WHERE profs.fn = '{}' \
-        AND profs.ln = '{}';".format(args_from_ui['prof_fn'], args_from_ui['prof_ln'])
-        evals_df = pd.read_sql_query(query, db)
-        evals = list(evals_df['inst_resp'])
-
-    clean = ' '.join([x for x in evals if x != None])
-
-    wc = WordCloud(width = 2000, height = 700).generate(clean)
-
-    plt.figure(figsize = (20, 7))
-    plt.imshow(wc)
-    plt.axis("off")
-    plt.savefig('./static/images/wordcloud.png')
-    plt.close()
-    
-    pass
+    wc_query(args_from_ui)
+    if resolution == DEFAULT_RESOLUTION:
+        return image_cache.image_key('wordcloud', args_from_ui)
+    return image_cache.image_key('wordcloud_' + resolution, args_from_ui)
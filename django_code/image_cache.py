@@ -0,0 +1,137 @@
+#-------------------------------------------------------------------------------
+# Name:        image_cache
+# Purpose:     Keeps rendered graph and word cloud PNGs on disk, keyed by a
+#              hash of the search arguments, the kind of image and the
+#              database version, so that repeat searches are served without
+#              running matplotlib or WordCloud again, by whichever server
+#              process gets the request. Images are saved in one folder per
+#              database version. The folders of older versions are deleted,
+#              and the images least recently used are deleted once the
+#              current folder holds more than MAX_BYTES. An image that is
+#              being rendered in the background is marked by a file next to
+#              where it will be saved, so every process can tell it is coming.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/11/2018
+#-------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import time
+
+import db_pool
+import disk_cache
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), 'rendered_images')
+
+# the most the images of the current database version may take up on disk
+MAX_BYTES = 256 * 1024 * 1024
+
+# seconds after which a pending mark is ignored, in case the process that
+# made it died before the image was saved
+PENDING_TIMEOUT = 120
+
+
+def image_key(kind, args):
+    '''
+    Returns the content address of an image
+
+      - kind is a string naming the renderer, e.g. 'wordcloud'
+      - args is the dictionary of search arguments
+    '''
+    ident = json.dumps([kind, args, db_pool.data_version()], sort_keys = True)
+    return hashlib.sha1(ident.encode('utf-8')).hexdigest()
+
+
+def image_path(key):
+    '''
+    Returns the file the image stored under key is saved in
+    '''
+    return os.path.join(CACHE_DIR, db_pool.data_version(), key + '.png')
+
+
+def get(key):
+    '''
+    Returns the PNG bytes stored under key, or None if there are none
+    '''
+    return disk_cache.read(image_path(key))
+
+
+def exists(key):
+    '''
+    Returns True if there is an image stored under key
+    '''
+    return os.path.exists(image_path(key))
+
+
+def put(key, png):
+    '''
+    Stores PNG bytes under key, then deletes older versions' images and the
+    least recently used ones if there are more than MAX_BYTES
+    '''
+    disk_cache.write(image_path(key), png)
+    prune()
+    disk_cache.trim(os.path.join(CACHE_DIR, db_pool.data_version()), MAX_BYTES, '.png')
+
+
+def get_or_render(kind, args, render):
+    '''
+    Returns the key of the image of the given kind for args, calling
+    render(args) to produce the PNG bytes only if it is not cached yet
+    '''
+    key = image_key(kind, args)
+    if get(key) is None:
+        put(key, render(args))
+    return key
+
+
+def claim(key):
+    '''
+    Marks the image stored under key as pending. Returns True if this call
+    made the mark, or False if the image is already pending, so that it is
+    rendered only once across every server process.
+    '''
+    mark = image_path(key) + '.pending'
+    if is_pending(key):
+        return False
+    try:
+        os.makedirs(os.path.dirname(mark), exist_ok = True)
+        if os.path.exists(mark): # left behind by a render that never finished
+            os.remove(mark)
+        os.close(os.open(mark, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def release(key):
+    '''
+    Removes the pending mark of the image stored under key
+    '''
+    try:
+        os.remove(image_path(key) + '.pending')
+    except OSError:
+        pass
+
+
+def is_pending(key):
+    '''
+    Returns True if the image stored under key is marked pending, and the
+    mark was made less than PENDING_TIMEOUT seconds ago
+    '''
+    try:
+        age = time.time() - os.path.getmtime(image_path(key) + '.pending')
+    except OSError:
+        return False
+    return age < PENDING_TIMEOUT
+
+
+def prune():
+    '''
+    Deletes the images saved for every database version but the current one
+    '''
+    disk_cache.prune(CACHE_DIR, db_pool.data_version())
@@ -0,0 +1,146 @@
+#-------------------------------------------------------------------------------
+# Name:        eval_snapshot
+# Purpose:     Queries the sql database and writes every evaluation, joined
+#              with its course and professors, to Arrow IPC files that the
+#              website memory-maps instead of querying sqlite for each
+#              search. evals_by_dept.arrow holds a row per department the
+#              course belongs to (as in 'dept_courses'), sorted by department
+#              and course number; evals_by_prof.arrow holds the same
+#              evaluations once each, sorted by professor. tosql.py rebuilds
+#              them along with the database; run this file to rebuild them
+#              by hand.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/12/2018
+#-------------------------------------------------------------------------------
+
+import sqlite3
+import os
+
+import numpy as np
+import pyarrow as pa
+
+RES_DIR = os.path.dirname(os.path.abspath(__file__))
+BY_DEPT_FILENAME = os.path.join(RES_DIR, 'evals_by_dept.arrow')
+BY_PROF_FILENAME = os.path.join(RES_DIR, 'evals_by_prof.arrow')
+DATABASE_FILENAME = os.path.join(RES_DIR, '..', 'reevaluations.db')
+
+# bumped whenever the layout of the files changes
+FORMAT = 1
+
+# the columns of every row, as the evaluation queries in queries.py select
+# them when no columns are given
+EVAL_SELECT = '''evals.*, courses.course, courses.year, courses.term,
+    profs.fn, profs.ln'''
+
+# Rows within a course or professor keep the order sqlite's own queries
+# return them in (by course_id, then professor, then evaluation), so results
+# read from the files match the database row for row.
+BY_DEPT = '''SELECT dept_courses.dept AS dept,
+    CAST(courses.course_number AS TEXT) AS course_number, {}
+    FROM dept_courses JOIN courses JOIN profs JOIN evals
+    ON dept_courses.course_id = courses.course_id
+    AND courses.course_id = evals.course_id
+    AND courses.course_id = profs.course_id
+    ORDER BY dept_courses.dept, course_number, dept_courses.course_id,
+    courses.rowid, profs.rowid, evals.rowid;'''.format(EVAL_SELECT)
+
+BY_PROF = '''SELECT {}
+    FROM courses JOIN profs JOIN evals
+    ON courses.course_id = evals.course_id
+    AND courses.course_id = profs.course_id
+    WHERE profs.fn IS NOT NULL AND profs.ln IS NOT NULL
+    ORDER BY profs.ln, profs.fn, profs.rowid, courses.rowid,
+    evals.rowid;'''.format(EVAL_SELECT)
+
+# the columns of evals_by_dept.arrow that only locate rows
+KEY_COLUMNS = ('dept', 'course_number')
+
+
+def to_array(values):
+    '''
+    Takes a list of values read from sqlite and returns them as an Arrow
+    array: integers as int64 (with nulls), other numbers as float64 with NULL
+    stored as NaN so they can be read without a copy, and anything else as
+    strings
+    '''
+    kinds = {type(v) for v in values if v is not None}
+    if kinds == {int}:
+        return pa.array(values, type = pa.int64())
+    if kinds and kinds <= {int, float}:
+        return pa.array(np.array([np.nan if v is None else v for v in values],
+                                 dtype = np.float64))
+    return pa.array([None if v is None else str(v) for v in values], type = pa.string())
+
+
+def build_table(connection, query):
+    '''
+    Takes a sqlite3 connection and one of the queries above and returns its
+    result as an Arrow table, with the database's user_version (set by
+    tosql.py) and FORMAT in the schema metadata
+    '''
+    cursor = connection.execute(query)
+    names = [d[0] for d in cursor.description]
+    rows = cursor.fetchall()
+    columns = zip(*rows) if rows else [()] * len(names)
+
+    version = connection.execute('PRAGMA user_version;').fetchone()[0]
+    table = pa.table([to_array(list(values)) for values in columns], names = names)
+    return table.replace_schema_metadata({'format': str(FORMAT), 'version': str(version)})
+
+
+def write_table(table, filename):
+    '''
+    Writes table to filename as an uncompressed Arrow IPC file, so it can be
+    memory-mapped. It is written to a temporary file next to filename and
+    renamed, so the website never reads a partial file
+    '''
+    tmp = filename + '.tmp'
+    with pa.OSFile(tmp, 'wb') as f:
+        with pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, filename)
+
+
+def read_table(filename):
+    '''
+    Memory-maps the Arrow IPC file at filename and returns it as a table,
+    or None if there is no file or it was written in another FORMAT. The
+    table's columns point straight into the mapped file.
+    '''
+    try:
+        source = pa.memory_map(filename, 'r')
+    except FileNotFoundError:
+        return None
+    table = pa.ipc.open_file(source).read_all()
+    if (table.schema.metadata or {}).get(b'format') != str(FORMAT).encode():
+        return None
+    return table
+
+
+def table_version(table):
+    '''
+    Returns the database user_version a table was built from
+    '''
+    return int(table.schema.metadata[b'version'])
+
+
+def write_snapshot(connection, by_dept_filename = BY_DEPT_FILENAME,
+                   by_prof_filename = BY_PROF_FILENAME):
+    '''
+    Takes a sqlite3 connection to a database with the 'dept_courses',
+    'courses', 'profs' and 'evals' tables and writes both files
+    '''
+    write_table(build_table(connection, BY_DEPT), by_dept_filename)
+    write_table(build_table(connection, BY_PROF), by_prof_filename)
+
+
+def generate_snapshot(db_path = DATABASE_FILENAME):
+    connection = sqlite3.connect(db_path)
+    write_snapshot(connection)
+    connection.close()
+
+
+if __name__ == "__main__":
+    generate_snapshot()
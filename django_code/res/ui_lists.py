@@ -1,9 +1,11 @@
 #-------------------------------------------------------------------------------
 # Name:        ui_lists
-# Purpose:     Queries the sql database and builds csv files of lists of 
-#              department codes, course numbers, course names, professor 
-#              last names, and professor first names to populate
-#              the dropdown menus on the website.
+# Purpose:     Queries the sql database and builds ui_lists.pickle, which
+#              holds the department names and the lists of department
+#              codes, courses, and professors that the website suggests in
+#              its search forms, so the website can load them with one read
+#              when it starts. tosql.py rebuilds it along with the database;
+#              run this file to rebuild it by hand.
 #
 # Author:      Lily Li
 #
@@ -12,55 +14,113 @@
 
 import sqlite3
 import csv
+import os
+import pickle
 
+RES_DIR = os.path.dirname(os.path.abspath(__file__))
+UI_LISTS_FILENAME = os.path.join(RES_DIR, 'ui_lists.pickle')
+DEPT_NAMES_FILENAME = os.path.join(RES_DIR, 'depts.csv')
+DATABASE_FILENAME = os.path.join(RES_DIR, '..', 'reevaluations.db')
 
-def generate_lists():
-    connection = sqlite3.connect('reevaluations.db')
-    c = connection.cursor()
-
-    # get lists of unique, non-null values from sql database
-    dept = c.execute('''SELECT DISTINCT dept FROM courses WHERE dept IS NOT 
-        NULL and dept <> "" ORDER BY dept''').fetchall()
-    course_num = c.execute('''SELECT DISTINCT course_number FROM courses 
-        WHERE course_number IS NOT NULL and course_number <> "" ORDER BY 
-        course_number''').fetchall()
-    course_name = c.execute('''SELECT DISTINCT course FROM courses 
-        WHERE course IS NOT NULL and course <> "" ORDER BY 
-        course''').fetchall()
-    prof_ln = c.execute('''SELECT DISTINCT ln FROM profs WHERE 
-        ln IS NOT NULL and ln <> "" ORDER BY ln''').fetchall()
-    prof_fn = c.execute('''SELECT DISTINCT fn FROM profs WHERE 
-        fn IS NOT NULL and fn <> "" ORDER BY fn''').fetchall()
+# bumped whenever the contents of the pickle change shape
+FORMAT = 1
 
+
+def read_dept_names(filename = DEPT_NAMES_FILENAME):
+    '''
+    Returns a dictionary mapping department codes to department names
+    '''
+    dept_names = {}
+    with open(filename, encoding = 'iso-8859-1') as f:
+        for row in csv.reader(f):
+            if row:
+                dept_names[row[0]] = row[1].strip()
+    return dept_names
+
+
+def course_order(course):
+    '''
+    Sort key for a (dept, course number, course name) row that orders it as 
+    sqlite does: course numbers by value, and any stored as text after them
+    '''
+    dept, num, name = course
+    return dept, isinstance(num, str), num, name
+
+
+def build_lists(connection):
+    '''
+    Takes a sqlite3 connection and returns a dictionary of the lookup
+    tables used by the website, built in a single pass over the courses
+    joined with their professors:
+
+      - dept_names maps department codes to names
+      - depts is a tuple of department codes
+      - courses is a tuple of (dept, course number, course name)
+      - profs is a tuple of (first name, last name)
+      - version is the database's user_version, set by tosql.py, so the 
+        website can tell whether the lists match the database
+      - format is FORMAT
+    '''
+    depts = set()
+    courses = set()
+    profs = set()
+
+    rows = connection.execute('''SELECT courses.dept, courses.course_number,
+        courses.course, profs.fn, profs.ln FROM courses LEFT JOIN profs
+        ON courses.course_id = profs.course_id''')
+    for dept, num, name, fn, ln in rows:
+        if dept:
+            depts.add(dept)
+            if num and name:
+                courses.add((dept, num, name))
+        if fn and ln:
+            profs.add((fn, ln))
+
+    version = connection.execute('PRAGMA user_version;').fetchone()[0]
+
+    return {'format': FORMAT,
+            'version': version,
+            'dept_names': read_dept_names(),
+            'depts': tuple(sorted(depts)),
+            'courses': tuple((dept, str(num), name) for dept, num, name
+                             in sorted(courses, key = course_order)),
+            'profs': tuple(sorted(profs, key = lambda prof: (prof[1], prof[0])))}
+
+
+def write_lists(lists, filename = UI_LISTS_FILENAME):
+    '''
+    Pickles lists to filename. The pickle is written to a temporary file 
+    next to it and renamed, so the website never reads a partial file
+    '''
+    tmp = filename + '.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(lists, f, protocol = pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+
+def read_lists(filename = UI_LISTS_FILENAME):
+    '''
+    Returns the lists pickled at filename, or None if there are none or 
+    they were written in another FORMAT
+    '''
+    try:
+        with open(filename, 'rb') as f:
+            lists = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    if lists.get('format') != FORMAT:
+        return None
+    return lists
+
+
+def generate_lists(db_path = DATABASE_FILENAME, filename = UI_LISTS_FILENAME):
+    connection = sqlite3.connect(db_path)
+    lists = build_lists(connection)
     connection.close()
+    write_lists(lists, filename)
+
 
-    # write lists of unique values to files
-    f = open('dept_list.csv', 'w')
-    w = csv.writer(f, delimiter="|")
-    for row in dept:
-        w.writerow(row)
-    f.close()
-
-    f = open('course_num_list.csv', 'w')
-    w = csv.writer(f, delimiter="|")
-    for row in course_num:
-        w.writerow(row)
-    f.close()
-
-    f = open('course_name_list.csv', 'w')
-    w = csv.writer(f, delimiter="|")
-    for row in course_name:
-        w.writerow(row)
-    f.close()
-
-    f = open('prof_ln_list.csv', 'w')
-    w = csv.writer(f, delimiter="|")
-    for row in prof_ln:
-        w.writerow(row)
-    f.close()
-
-    f = open('prof_fn_list.csv', 'w')
-    w = csv.writer(f, delimiter="|")
-    for row in prof_fn:
-        w.writerow(row)
-    f.close()
+if __name__ == "__main__":
+    generate_lists()
@@ -0,0 +1,66 @@
+#-------------------------------------------------------------------------------
+# Name:        response_search
+# Purpose:     Finds evaluations whose written course or instructor responses
+#              contain the given keywords, using the 'text_fts' full text
+#              index built by tosql.py over the responses as they were
+#              written, so every word a user types is searched for, common
+#              words included. Results are ranked by how well they match and
+#              returned one page at a time.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/12/2018
+#-------------------------------------------------------------------------------
+
+import re
+
+import db_pool
+import queries
+
+PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+WORD_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+RESULT_COLUMNS = ('course_id', 'dept', 'course_num', 'course_name', 'term',
+                  'year', 'profs', 'snippet')
+
+
+def fts_query(keywords):
+    '''
+    Turns what a user typed into an FTS5 query that matches responses
+    containing every word, in any order. Each word is quoted, so
+    punctuation and FTS5 operators in the input are never interpreted.
+    Returns None if keywords holds no words.
+    '''
+    words = WORD_RE.findall(keywords.lower())
+    if not words:
+        return None
+    return ' '.join('"{}"'.format(word) for word in words)
+
+
+def search_responses(keywords, page = 1, per_page = PER_PAGE):
+    '''
+    Takes a keyword string and returns the given page (counting from 1) of
+    matching evaluations as a dictionary:
+
+      - results is a list of dictionaries with the keys in RESULT_COLUMNS
+      - has_more is True if there is a next page
+
+    Raises ValueError if keywords holds no words or the page is not valid
+    '''
+    query = fts_query(keywords)
+    if query is None:
+        raise ValueError('No keywords to search for')
+    if page < 1 or not 1 <= per_page <= MAX_PER_PAGE:
+        raise ValueError('Page must be at least 1 and per_page between 1 and {}'
+            .format(MAX_PER_PAGE))
+
+    params = {'query': query, 'limit': per_page + 1, 'offset': (page - 1) * per_page}
+    with db_pool.connection() as db:
+        rows = queries.read_rows(db, queries.RESPONSE_SEARCH, params)
+
+    return {'page': page,
+            'per_page': per_page,
+            'has_more': len(rows) > per_page,
+            'results': [dict(zip(RESULT_COLUMNS, row)) for row in rows[:per_page]]}
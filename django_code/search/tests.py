@@ -1,3 +1,1036 @@
-from django.test import TestCase
+import io
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import Future
+from contextlib import contextmanager
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+import graphs
+import score_graphs
+import queries
+import courses
+import snapshot
+import eval_store
+import render_pipeline
+import response_search
+import gen_wordcloud
+import image_cache
+import resources
+import fuzzy
+import autocomplete
+from course_name_converter import convert_course_name_to_course_num
+from search.views import SearchForm_course
+from res import eval_snapshot
+from res import ui_lists
+
+# tosql.py builds the database from the folder above django_code and needs
+# nltk and the evaluation cleaning code, so its tests only run where those are
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+try:
+    import tosql
+except ImportError:
+    tosql = None
+finally:
+    sys.path.pop()
+needs_tosql = unittest.skipIf(tosql is None, 'tosql.py cannot be imported')
+
+
+def evals(rows, columns):
+    return pd.DataFrame(rows, columns = columns)
+
+
+class CompareMeansTests(SimpleTestCase):
+    '''
+    Checks the numbers behind the comparison graphs, on made up evaluations
+    so no database is needed
+    '''
+    TIME = ['low_time', 'avg_time', 'high_time', 'course', 'year', 'fn', 'ln']
+
+    def assertSeries(self, series, expected):
+        self.assertEqual(list(series.index), [label for label, value in expected])
+        for value, (label, want) in zip(series, expected):
+            if want is None:
+                self.assertTrue(math.isnan(value), label)
+            else:
+                self.assertAlmostEqual(value, want, msg = label)
+
+    def test_course_prof_graph(self):
+        course_and_prof_df = evals([(1, 2, 3, 'A', 2017, 'Ann', 'Lee'),
+                                    (3, 4, 5, 'A', 2016, 'Ann', 'Lee')], self.TIME)
+        dept_df = evals([(2, 4, 6, 'A', 2017, 'Ann', 'Lee'),
+                         (4, 8, 12, 'B', 2017, 'Bo', 'Ng'),
+                         (None, 6, None, 'C', 2015, 'Bo', 'Ng')], self.TIME)
+        course_df = evals([], self.TIME)
+        prof_df = evals([(1, 1, 1, 'A', 2017, 'Ann', 'Lee')], self.TIME)
+        args = {'dept': 'MATH', 'course_num': '101', 'prof_fn': 'Ann', 'prof_ln': 'Lee'}
+
+        chart = graphs.course_prof_graph(args, (course_and_prof_df, dept_df, course_df, prof_df),
+                                         as_json = True)
+
+        self.assertEqual(chart['labels'], ['Ann Lee and MATH 101', 'MATH', 'MATH 101', 'Ann Lee'])
+        self.assertEqual([s['values'] for s in chart['series']],
+                         [[2, 3, None, 1], [3, 6, None, 1], [4, 9, None, 1]])
+
+    def test_time_lists(self):
+        small_df = pd.DataFrame({'low_time': [1.5, 2], 'avg_time': [3, 4], 'high_time': [5, 6.25]},
+                                index = ['MATH 101', 'MATH 102'])
+        dept_df = evals([(1, 2, 4, 'A', 2017, 'Ann', 'Lee'),
+                         (2, 4, 8, 'B', 2017, 'Bo', 'Ng')], self.TIME)
+
+        lows, avgs, highs = graphs.time_lists(small_df, dept_df, 'MATH')
+
+        self.assertSeries(lows, [('MATH 101', 1.5), ('MATH 102', 2), ('MATH', 1.5)])
+        self.assertSeries(avgs, [('MATH 101', 3), ('MATH 102', 4), ('MATH', 3)])
+        self.assertSeries(highs, [('MATH 101', 5), ('MATH 102', 6.25), ('MATH', 6)])
+
+    def test_score_df_maker(self):
+        columns = list(score_graphs.COLUMNS)
+        prof_df = evals([(4, 3, 4, 2, .5, .1, 'MATH 101', 2017, 'Ann', 'Lee'),
+                         (5, 4, 5, 3, .3, .3, 'MATH 101', 2016, 'Ann', 'Lee'),
+                         (3, 2, 3, 4, .1, .2, 'MATH 202', 2017, 'Ann', 'Lee')], columns)
+        dept_df = evals([(2, 2, 2, 2, 0, 0, 'MATH 101', 2017, 'Bo', 'Ng'),
+                         (4, None, 4, 4, .4, .6, 'MATH 303', 2016, 'Bo', 'Ng')], columns)
+
+        scores = score_graphs.df_maker({'prof_fn': 'Ann', 'prof_ln': 'Lee'}, 'score', 'prof',
+                                       (prof_df, dept_df, 'MATH'))
+
+        self.assertEqual(list(scores.index), ['MATH 101', 'MATH 202', 'MATH'])
+        self.assertSeries(scores.prof_score, [('MATH 101', 4.5), ('MATH 202', 3), ('MATH', 3)])
+        self.assertSeries(scores.ass_score, [('MATH 101', 3.5), ('MATH 202', 2), ('MATH', 2)])
+        self.assertSeries(scores.test_score, [('MATH 101', 2.5), ('MATH 202', 4), ('MATH', 3)])
+
+        sentiment = score_graphs.df_maker({'prof_fn': 'Ann', 'prof_ln': 'Lee'}, 'sentiment', 'prof',
+                                          (prof_df, dept_df, 'MATH'))
+
+        self.assertSeries(sentiment.inst_sentiment, [('MATH 101', .4), ('MATH 202', .1), ('MATH', .2)])
+        self.assertSeries(sentiment.course_sentiment, [('MATH 101', .2), ('MATH 202', .2), ('MATH', .3)])
+
+
+def old_graph_small_df(dataframe, prof_or_course):
+    # graphs.get_small_df before window_means
+    current_year = 2018
+    timespan = 5
+    if prof_or_course == "prof":
+        while dataframe.course.unique().shape[0] > 10:
+            timespan -= 1
+            if timespan == 1:
+                break
+            dataframe = dataframe[dataframe.year >= current_year - timespan]
+        dataframe = dataframe.groupby(['course']).mean(numeric_only = True)
+
+    if prof_or_course == "course":
+        dataframe = dataframe.assign(prof_name = dataframe['fn'].astype('str') + ' ' + dataframe['ln'])
+        while dataframe.prof_name.unique().shape[0] > 10:
+            timespan -= 1
+            if timespan == 1:
+                break
+            dataframe = dataframe[dataframe.year >= current_year - timespan]
+        dataframe = dataframe.groupby(['prof_name']).mean(numeric_only = True)
+
+    return dataframe, current_year - timespan
+
+
+def old_score_small_df(dataframe, prof_or_course):
+    # score_graphs.get_small_df before window_means
+    current_year = 2018
+    timespan = 15
+    if prof_or_course == "prof":
+        while dataframe.course.unique().shape[0] > 10:
+            timespan -= 1
+            if timespan == 1:
+                break
+            dataframe = dataframe[dataframe.year >= current_year - timespan]
+        dataframe = dataframe.groupby(['course']).mean(numeric_only = True)
+
+    if prof_or_course == "course":
+        while dataframe.prof_name.unique().shape[0] > 10:
+            if timespan == 1:
+                break
+            timespan -= 1
+            dataframe = dataframe[dataframe.year >= current_year - timespan]
+        dataframe = dataframe.groupby(['prof_name']).mean(numeric_only = True)
+
+    return dataframe, current_year - timespan
+
+
+class WindowMeansTests(SimpleTestCase):
+    '''
+    Checks that window_means picks the same years and means as the loops
+    that dropped one year at a time, on random evaluations
+    '''
+    def random_evals(self, rng):
+        n = rng.integers(0, 120)
+        fns = np.array(['Ann', 'Bo', 'Cy', 'Di'])
+        lns = np.array(['Lee', 'Ng', 'Park', 'Ray', 'Sol'])
+        df = pd.DataFrame({'course': rng.integers(0, rng.integers(1, 30), n).astype(str),
+                           'year': rng.integers(2003, 2019, n),
+                           'fn': fns[rng.integers(0, len(fns), n)],
+                           'ln': lns[rng.integers(0, len(lns), n)],
+                           'avg_time': rng.random(n) * 10,
+                           'prof_score': rng.random(n) * 5})
+        return df.assign(prof_name = df['fn'] + ' ' + df['ln'])
+
+    def test_matches_old_loops(self):
+        rng = np.random.default_rng(0)
+        for i in range(100):
+            df = self.random_evals(rng)
+            for module, old in ((graphs, old_graph_small_df), (score_graphs, old_score_small_df)):
+                for kind in ('prof', 'course'):
+                    with self.subTest(i = i, module = module.__name__, kind = kind):
+                        means, year = module.get_small_df(df, kind)
+                        old_means, old_year = old(df, kind)
+                        self.assertEqual(year, old_year)
+                        pd.testing.assert_frame_equal(means, old_means)
+
+
+def make_db():
+    '''
+    Returns an in-memory database laid out as tosql.py builds it, with a few
+    made up courses. course_number is an INTEGER column, as in the real
+    database, CMSC 15100 is crosslisted into MATH, and ENGL 21000 is taught
+    by professors with apostrophes in their names.
+    '''
+    db = sqlite3.connect(':memory:', check_same_thread = False)
+    db.executescript('''
+        CREATE TABLE courses (course_id TEXT, course TEXT, course_number INTEGER,
+            dept TEXT, section INTEGER, term TEXT, year INTEGER);
+        CREATE TABLE profs (course_id TEXT, ln TEXT, fn TEXT);
+        CREATE TABLE evals (course_id TEXT, prof_score REAL, ass_score REAL,
+            over_score REAL, test_score REAL, num_responses INTEGER, low_time REAL,
+            avg_time REAL, high_time REAL, num_recommend INTEGER,
+            num_dont_recommend INTEGER, inst_sentiment REAL, course_sentiment REAL,
+            read_score REAL, good_inst INTEGER, bad_inst INTEGER,
+            would_like_inst TEXT, would_recommend TEXT);
+        CREATE TABLE dept_courses (dept TEXT NOT NULL, course_id TEXT NOT NULL,
+            PRIMARY KEY (dept, course_id)) WITHOUT ROWID;
+        CREATE TABLE prof_depts (fn TEXT, ln TEXT, dept TEXT);
+        CREATE INDEX courses_course_id ON courses (course_id);
+        CREATE INDEX profs_course_id ON profs (course_id);
+        CREATE INDEX evals_course_id ON evals (course_id);
+
+        INSERT INTO courses VALUES
+            ('c1', 'Calculus I', 15100, 'MATH', 1, 'Autumn', 2016),
+            ('c2', 'Calculus I', 15100, 'MATH', 2, 'Winter', 2017),
+            ('c3', 'Analysis', 20300, 'MATH', 1, 'Spring', 2017),
+            ('c4', 'Intro to Computer Science', 15100, 'CMSC', 1, 'Autumn', 2017),
+            ('c5', 'Shakespeare''s Comedies', 21000, 'ENGL', 1, 'Spring', 2017);
+        INSERT INTO profs VALUES
+            ('c1', 'Lee', 'Ann'), ('c2', 'Ng', 'Bo'), ('c3', 'Lee', 'Ann'),
+            ('c4', 'Lee', 'Ann'), ('c4', 'Park', 'Cy'),
+            ('c5', 'D''Arcy', 'Liam'), ('c5', 'O''Neil', 'Kay');
+        INSERT INTO evals VALUES
+            ('c1', 4.5, 3, 4, NULL, 20, 3, 6, 9, 15, 5, .4, .2, 3.5, 18, 2, 'yes', 'yes'),
+            ('c1', 3.5, 4, NULL, 2, 12, 4, 7, 10, 8, 4, .1, .3, NULL, 9, 3, 'no', 'yes'),
+            ('c2', 2, 2.5, 3, 3, NULL, 5, 8.5, 12, NULL, NULL, -.2, .1, 2, NULL, NULL, NULL, 'no'),
+            ('c3', 5, 4.5, 4.75, 4, 7, 6, 9, 14, 6, 1, .6, .5, 4, 7, 0, 'yes', NULL),
+            ('c4', 4, 3.5, 4, 3.25, 40, 8, 12, 16, 30, 10, .3, .2, 3, 35, 5, 'yes', 'yes'),
+            ('c5', 4.25, 4, 4.5, NULL, 15, 2, 4, 6, 12, 3, .5, .4, 4.5, 14, 1, 'yes', 'yes');
+        INSERT INTO dept_courses VALUES
+            ('MATH', 'c1'), ('MATH', 'c2'), ('MATH', 'c3'), ('MATH', 'c4'),
+            ('CMSC', 'c4'), ('ENGL', 'c5');
+        INSERT INTO prof_depts VALUES ('Ann', 'Lee', 'MATH'), ('Bo', 'Ng', 'MATH'),
+            ('Cy', 'Park', 'CMSC'), ('Liam', 'D''Arcy', 'ENGL'), ('Kay', 'O''Neil', 'ENGL');
+
+        CREATE TABLE dept_rank (dept TEXT PRIMARY KEY, dept_name TEXT,
+            num_evals INTEGER, avg_time REAL, prof_score REAL) WITHOUT ROWID;
+        INSERT INTO dept_rank VALUES ('CMSC', 'Computer Science', 5, 12, 4),
+            ('ENGL', 'English Language and Literature', 15, 4, 4.25),
+            ('MATH', 'Mathematics', 30, 7.5, 3.9);
+
+        CREATE TABLE course_term_freqs (course_id TEXT, word TEXT, course_count INTEGER);
+        CREATE TABLE term_freqs (course_id TEXT, fn TEXT, ln TEXT, word TEXT,
+            inst_count INTEGER);
+        INSERT INTO course_term_freqs VALUES ('c5', 'plays', 3), ('c5', 'sonnets', 1);
+        INSERT INTO term_freqs VALUES ('c5', 'Liam', 'D''Arcy', 'witty', 2),
+            ('c5', 'Kay', 'O''Neil', 'kind', 1);
+
+        CREATE VIRTUAL TABLE text_fts USING fts5(course_id UNINDEXED, course_resp, inst_resp);
+        INSERT INTO text_fts VALUES
+            ('c1', 'The curve was generous.' || char(10) || 'Weekly problem sets.', 'Great lecturer'),
+            ('c2', 'No curve at all', NULL),
+            ('c4', 'Problem sets took forever', 'Office hours were the best part of the class');
+        ''')
+    return db
+
+
+@contextmanager
+def use_db(db):
+    '''
+    Makes db_pool hand out db for the duration of a with block
+    '''
+    @contextmanager
+    def connection():
+        yield db
+    with mock.patch('db_pool.connection', connection):
+        yield
+
+
+def lists_of(db):
+    """Returns the lookup lists of db as resources.ui_lists would."""
+    return resources.UILists(
+        dept_names = {'CMSC': 'Computer Science', 'MATH': 'Mathematics'},
+        depts = tuple(r[0] for r in db.execute('SELECT DISTINCT dept FROM dept_courses ORDER BY dept')),
+        courses = tuple((dept, str(num), name) for dept, num, name in db.execute(
+            """SELECT DISTINCT dept_courses.dept, courses.course_number, courses.course
+            FROM dept_courses JOIN courses ON dept_courses.course_id = courses.course_id
+            ORDER BY 1, 2""")),
+        profs = tuple(db.execute('SELECT DISTINCT fn, ln FROM profs ORDER BY ln, fn')))
+
+
+# one search for each evaluation query that find_courses runs
+SEARCHES = [
+    (queries.DEPT, {'dept': 'MATH'}),
+    (queries.COURSE_NUM, {'dept': 'MATH', 'course_num': '15100'}),
+    (queries.COURSE_NUM_AND_PROF, {'dept': 'MATH', 'course_num': '15100',
+                                   'prof_fn': 'Ann', 'prof_ln': 'Lee'}),
+    (queries.PROF, {'prof_fn': 'Ann', 'prof_ln': 'Lee'}),
+]
+
+
+class EvalParityMixin:
+    '''
+    Compares evaluation results read some other way with sqlite's
+    '''
+    def assertSameEvals(self, found, expected, rtol = 1e-12):
+        found = pd.DataFrame(found)
+        self.assertEqual(list(found.columns), list(expected.columns))
+        self.assertEqual(len(found), len(expected))
+        key = [c for c in ('course_id', 'fn', 'ln', 'prof_score') if c in expected]
+        found = found.sort_values(key, kind = 'stable').reset_index(drop = True)
+        expected = expected.sort_values(key, kind = 'stable').reset_index(drop = True)
+        for c in expected.columns:
+            if expected[c].dtype == object:
+                self.assertEqual(list(found[c]), list(expected[c]), c)
+            else:
+                np.testing.assert_allclose(found[c].astype(float), expected[c].astype(float),
+                                           rtol = rtol, err_msg = c)
+
+
+class SnapshotTests(EvalParityMixin, SimpleTestCase):
+    '''
+    Checks that searches read from the Arrow snapshot match sqlite
+    '''
+    def setUp(self):
+        self.db = make_db()
+        self.snap = snapshot.index(eval_snapshot.build_table(self.db, eval_snapshot.BY_DEPT),
+                                   eval_snapshot.build_table(self.db, eval_snapshot.BY_PROF))
+
+    def test_queries_match_sqlite(self):
+        for query, params in SEARCHES:
+            with self.subTest(params = params):
+                self.assertSameEvals(snapshot.read(self.snap, query, params),
+                                     queries.read_evals(self.db, query, params))
+
+    def test_course_name_search(self):
+        # course_number is an INTEGER column, but the snapshot is keyed by text
+        with use_db(self.db), mock.patch('snapshot.load', return_value = self.snap), \
+                mock.patch('fuzzy.match_course_name', return_value = None):
+            course_num, course_name = convert_course_name_to_course_num('MATH', 'Calculus I')
+            args = {'dept': 'MATH', 'course_num': course_num}
+            course_df, dept_df = courses.find_courses(args)
+
+        self.assertEqual((course_num, course_name), ('15100', 'Calculus I'))
+        self.assertEqual(len(course_df), 5)
+        self.assertSameEvals(course_df, queries.read_evals(self.db, queries.COURSE_NUM,
+                                                           {'dept': 'MATH', 'course_num': 15100}))
+
+
+class EvalStoreTests(EvalParityMixin, SimpleTestCase):
+    '''
+    Checks that searches looked up in the in-memory store match sqlite, to
+    within float32
+    '''
+    COLUMNS = list(render_pipeline.COLUMNS)
+
+    def setUp(self):
+        self.db = make_db()
+        self.store = eval_store.build_store(
+            eval_snapshot.build_table(self.db, eval_snapshot.BY_DEPT),
+            eval_snapshot.build_table(self.db, eval_snapshot.BY_PROF))
+
+    def test_queries_match_sqlite(self):
+        for query, params in SEARCHES:
+            with self.subTest(params = params):
+                self.assertSameEvals(eval_store.find(self.store, query, params, self.COLUMNS),
+                                     queries.read_evals(self.db, query, params, self.COLUMNS),
+                                     rtol = 1e-6)
+
+    def test_lookups_are_views(self):
+        found = eval_store.find(self.store, queries.DEPT, {'dept': 'MATH'}, ['low_time'])
+        self.assertTrue(np.shares_memory(found['low_time'], self.store.by_dept.arrays['low_time']))
+
+    def test_course_name_search(self):
+        # the graphs give columns, so their searches are answered by the store
+        with use_db(self.db), mock.patch('eval_store.load', return_value = self.store), \
+                mock.patch('fuzzy.match_course_name', return_value = None):
+            args = {'dept': 'MATH',
+                    'course_num': convert_course_name_to_course_num('MATH', 'Calculus I')[0],
+                    'prof_fn': 'Ann', 'prof_ln': 'Lee'}
+            results = courses.find_courses(args, self.COLUMNS)
+
+        for found, (query, params) in zip(results, [SEARCHES[2], SEARCHES[0], SEARCHES[1], SEARCHES[3]]):
+            with self.subTest(params = params):
+                self.assertSameEvals(found, queries.read_evals(self.db, query, params, self.COLUMNS),
+                                     rtol = 1e-6)
+        self.assertEqual(len(results[0]), 3)
+
+
+class ResponseSearchTests(SimpleTestCase):
+    '''
+    Checks keyword searches over the written responses
+    '''
+    def test_fts_query(self):
+        self.assertEqual(response_search.fts_query('Problem sets'), '"problem" "sets"')
+        self.assertEqual(response_search.fts_query("don't skip"), '"don\'t" "skip"')
+        # FTS5 operators and punctuation are searched for as words or dropped
+        self.assertEqual(response_search.fts_query('curve* OR "NEAR"('), '"curve" "or" "near"')
+        self.assertIsNone(response_search.fts_query(' ?! '))
+
+    def search(self, keywords, page = 1, per_page = 20):
+        with use_db(make_db()):
+            return response_search.search_responses(keywords, page, per_page)
+
+    def test_stopwords_match(self):
+        # the index holds the responses as written, so "the" is searched for too
+        found = self.search('the curve')
+        self.assertEqual([r['course_id'] for r in found['results']], ['c1'])
+        self.assertIn('The curve was generous', found['results'][0]['snippet'])
+        self.assertEqual(len(self.search('curve')['results']), 2)
+
+    def test_pages(self):
+        first = self.search('problem sets', per_page = 1)
+        second = self.search('problem sets', page = 2, per_page = 1)
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        found = first['results'] + second['results']
+        self.assertEqual({r['course_id']: r['profs'] for r in found},
+                         {'c1': 'Ann Lee', 'c4': 'Ann Lee, Cy Park'})
+
+    def test_bad_input(self):
+        with self.assertRaises(ValueError):
+            self.search('...')
+        with self.assertRaises(ValueError):
+            self.search('curve', page = 0)
+
+
+class UIListsTests(SimpleTestCase):
+    '''
+    Checks the lookup lists pickled by res/ui_lists.py and loaded by
+    resources.py
+    '''
+    def setUp(self):
+        self.db = make_db()
+        self.folder = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.folder.name, 'ui_lists.pickle')
+        resources.ui_lists.cache_clear()
+
+    def tearDown(self):
+        resources.ui_lists.cache_clear()
+        self.folder.cleanup()
+
+    def load(self):
+        '''Returns resources.ui_lists() as loaded from self.filename and self.db'''
+        read_lists = ui_lists.read_lists
+        read = lambda: read_lists(self.filename)
+        with use_db(self.db), mock.patch('res.ui_lists.read_lists', read):
+            return resources.ui_lists()
+
+    def test_pickle_round_trip(self):
+        lists = ui_lists.build_lists(self.db)
+        ui_lists.write_lists(lists, self.filename)
+        self.assertEqual(ui_lists.read_lists(self.filename), lists)
+        self.assertEqual(os.listdir(self.folder.name), ['ui_lists.pickle'])
+
+    def test_pickle_is_loaded(self):
+        lists = dict(ui_lists.build_lists(self.db), depts = ('PICK',))
+        ui_lists.write_lists(lists, self.filename)
+        loaded = self.load()
+        self.assertEqual(loaded.depts, ('PICK',))
+        self.assertEqual(loaded.profs, lists['profs'])
+        self.assertIs(self.load(), loaded)
+        with self.assertRaises(TypeError):
+            loaded.dept_names['PICK'] = 'Pickles'
+
+    def test_mismatch_builds_from_database(self):
+        built = ui_lists.build_lists(self.db)
+        for change in ({'format': ui_lists.FORMAT + 1}, {'version': built['version'] + 1}):
+            with self.subTest(change = change):
+                ui_lists.write_lists(dict(built, depts = ('PICK',), **change), self.filename)
+                resources.ui_lists.cache_clear()
+                self.assertEqual(self.load().depts, built['depts'])
+        os.remove(self.filename)
+        resources.ui_lists.cache_clear()
+        self.assertIsNone(ui_lists.read_lists(self.filename))
+        self.assertEqual(self.load().courses, built['courses'])
+
+    def test_build_lists_matches_queries(self):
+        # the five SELECT DISTINCT queries build_lists replaced, on courses
+        # and professors with missing fields and course numbers of any length
+        self.db.executescript('''
+            INSERT INTO courses VALUES ('c6', 'Topics', 9900, 'MATH', 1, 'Autumn', 2017),
+                ('c7', 'Reading Course', 29900, 'MATH', 1, 'Autumn', 2017),
+                ('c8', 'Untitled', 10100, NULL, 1, 'Autumn', 2017),
+                ('c9', '', 10200, 'ENGL', 1, 'Autumn', 2017);
+            INSERT INTO profs VALUES ('c6', 'Moss', ''), ('c8', 'Ray', 'Al'), ('c9', NULL, 'Ed');
+            PRAGMA user_version = 7;
+            ''')
+        depts = self.db.execute('''SELECT DISTINCT dept FROM courses WHERE dept IS NOT
+            NULL and dept <> "" ORDER BY dept''').fetchall()
+        course_rows = self.db.execute('''SELECT DISTINCT dept, course_number, course
+            FROM courses WHERE dept IS NOT NULL and dept <> ""
+            and course_number IS NOT NULL and course_number <> ""
+            and course IS NOT NULL and course <> ""
+            ORDER BY dept, course_number, course''').fetchall()
+        profs = self.db.execute('''SELECT DISTINCT fn, ln FROM profs WHERE
+            fn IS NOT NULL and fn <> "" and ln IS NOT NULL and ln <> ""
+            ORDER BY ln, fn''').fetchall()
+
+        lists = ui_lists.build_lists(self.db)
+        self.assertEqual(lists['depts'], tuple(dept for (dept,) in depts))
+        self.assertEqual(lists['courses'],
+                         tuple((dept, str(num), name) for dept, num, name in course_rows))
+        self.assertEqual(lists['profs'], tuple(profs))
+        self.assertEqual((lists['format'], lists['version']), (ui_lists.FORMAT, 7))
+
+
+class AutocompleteTests(SimpleTestCase):
+    '''
+    Checks the prefix lookups behind the typeahead inputs
+    '''
+    def setUp(self):
+        patcher = mock.patch('resources.ui_lists', return_value = lists_of(make_db()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        autocomplete._index.cache_clear()
+        self.addCleanup(autocomplete._index.cache_clear)
+
+    def labels(self, text, kind = None, limit = autocomplete.LIMIT):
+        return [found['label'] for found in autocomplete.suggest(text, kind, limit)]
+
+    def test_prefixes(self):
+        # department codes and names, ignoring case and extra spaces
+        self.assertEqual(self.labels('ma', 'dept'), ['MATH Mathematics'])
+        self.assertEqual(self.labels('COMPUTER  sc', 'dept'), ['CMSC Computer Science'])
+        # course codes, numbers and names
+        self.assertEqual(self.labels('math 2'), ['MATH 20300 Analysis'])
+        self.assertEqual(self.labels('151', 'course'), ['CMSC 15100 Intro to Computer Science',
+            'MATH 15100 Calculus I', 'MATH 15100 Intro to Computer Science'])
+        self.assertEqual(self.labels('  CALC '), ['MATH 15100 Calculus I'])
+        # professor full and last names
+        self.assertEqual(self.labels('lee'), ['Ann Lee'])
+        self.assertEqual(self.labels('bo n', 'prof'), ['Bo Ng'])
+        self.assertEqual(self.labels('zz'), [])
+        self.assertEqual(self.labels('  '), [])
+
+    def test_fields(self):
+        self.assertEqual(autocomplete.suggest('cy', 'prof'),
+                         [{'prof_fn': 'Cy', 'prof_ln': 'Park', 'kind': 'prof', 'label': 'Cy Park'}])
+        self.assertEqual(autocomplete.suggest('anal'),
+                         [{'dept': 'MATH', 'course_num': '20300', 'course_name': 'Analysis',
+                           'kind': 'course', 'label': 'MATH 20300 Analysis'}])
+
+    def test_kinds_in_order_and_limit(self):
+        self.assertEqual([found['kind'] for found in autocomplete.suggest('c')],
+                         ['dept', 'course', 'course', 'prof'])
+        self.assertEqual(self.labels('c', limit = 2),
+                         ['CMSC Computer Science', 'MATH 15100 Calculus I'])
+
+    def test_bad_requests(self):
+        for kind, limit in (('room', 10), (None, 0), (None, autocomplete.MAX_LIMIT + 1)):
+            with self.subTest(kind = kind, limit = limit), self.assertRaises(ValueError):
+                autocomplete.suggest('c', kind, limit)
+        self.assertEqual(self.client.get('/autocomplete.json?q=c&limit=x').status_code, 400)
+        self.assertEqual(self.client.get('/autocomplete.json?q=c&kind=room').status_code, 400)
+
+    def test_typed_dept_is_normalized(self):
+        form = SearchForm_course({'dept': ' math ', 'course_num': '15100'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data['dept'], 'MATH')
+
+    def test_view(self):
+        response = self.client.get('/autocomplete.json?q=lee&kind=prof')
+        self.assertEqual(response.json(), {'results': [
+            {'prof_fn': 'Ann', 'prof_ln': 'Lee', 'kind': 'prof', 'label': 'Ann Lee'}]})
+
+
+class WordcloudSearchTests(SimpleTestCase):
+    '''
+    Checks which searches a word cloud can be made for
+    '''
+    def test_wc_query(self):
+        self.assertEqual(gen_wordcloud.wc_query({'dept': 'MATH', 'course_num': '15100'})[0],
+                         'course_num')
+        self.assertEqual(gen_wordcloud.wc_query({'prof_fn': 'Ann', 'prof_ln': 'Lee'})[0], 'prof')
+        self.assertEqual(gen_wordcloud.wc_query({'dept': 'MATH', 'course_num': '15100',
+            'prof_fn': 'Ann', 'prof_ln': 'Lee'})[0], 'course_num_and_prof')
+        for args in ({'dept': 'MATH'}, {'prof_ln': 'Lee'}, {},
+                     {'dept': 'MATH', 'prof_fn': 'Ann', 'prof_ln': 'Lee'}):
+            with self.subTest(args = args), self.assertRaises(ValueError):
+                gen_wordcloud.wc_query(args)
+
+    def test_partial_search_is_bad_request(self):
+        for query in ('', '?dept=MATH', '?prof_fn=Ann', '?dept=MATH&prof_fn=Ann&prof_ln=Lee',
+                      '?dept=MATH&course_num=15100&prof_ln=Lee'):
+            with self.subTest(query = query):
+                self.assertEqual(self.client.get('/wordcloud.png' + query).status_code, 400)
+
+
+class BoundParameterTests(SimpleTestCase):
+    '''
+    Checks that searches for names with apostrophes reach sqlite as bound
+    parameters, and that only known columns can rank departments
+    '''
+    def setUp(self):
+        self.db = make_db()
+
+    def find(self, args):
+        with use_db(self.db), mock.patch('snapshot.load', return_value = None):
+            return courses.find_courses(args)
+
+    def test_prof_search(self):
+        prof_df, dept_df, primary_dept = self.find({'prof_fn': 'Liam', 'prof_ln': "D'Arcy"})
+        self.assertEqual(list(prof_df['course_id']), ['c5'])
+        self.assertEqual(primary_dept, 'ENGL')
+        self.assertEqual(list(dept_df['course_id']), ['c5', 'c5'])
+
+    def test_course_and_prof_search(self):
+        args = {'dept': 'ENGL', 'course_num': '21000', 'prof_fn': 'Kay', 'prof_ln': "O'Neil"}
+        course_and_prof_df, dept_df, course_df, prof_df = self.find(args)
+        self.assertEqual(list(course_and_prof_df['ln']), ["O'Neil"])
+        self.assertEqual(sorted(course_df['ln']), ["D'Arcy", "O'Neil"])
+        self.assertEqual(list(prof_df['course_id']), ['c5'])
+
+    def test_word_clouds(self):
+        searches = [({'prof_fn': 'Liam', 'prof_ln': "D'Arcy"}, {'witty': 2}),
+                    ({'dept': 'ENGL', 'course_name': "Shakespeare's Comedies"},
+                     {'plays': 3, 'sonnets': 1}),
+                    ({'dept': 'ENGL', 'course_num': '21000', 'prof_fn': 'Kay', 'prof_ln': "O'Neil"},
+                     {'plays': 3, 'sonnets': 1, 'kind': 1})]
+        for args, expected in searches:
+            with self.subTest(args = args), use_db(self.db):
+                self.assertEqual(gen_wordcloud.get_wc_freqs(args), expected)
+
+    def test_rank(self):
+        for rank, expected in (('avg_time', ['MATH', 'ENGL']), ('prof_score', ['ENGL', 'MATH'])):
+            with self.subTest(rank = rank):
+                rank_df, = self.find({'rank': rank})
+                self.assertEqual(list(rank_df['Department Code']), expected)
+
+    def test_rejected_rank(self):
+        for rank in ('dept', "avg_time; DROP TABLE evals; --", ''):
+            with self.subTest(rank = rank):
+                with self.assertRaises(ValueError):
+                    queries.rank_query(rank)
+                with self.assertRaises(ValueError):
+                    self.find({'rank': rank})
+        self.assertEqual(self.db.execute('SELECT COUNT(*) FROM evals;').fetchone(), (6,))
+
+
+def done(result = None, error = None):
+    """Returns a finished future holding result, or raising error."""
+    future = Future()
+    if error is None:
+        future.set_result(result)
+    else:
+        future.set_exception(error)
+    return future
+
+
+class RenderPipelineTests(SimpleTestCase):
+    '''
+    Checks that the images of a search are rendered independently
+    '''
+    ARGS = {'dept': 'MATH', 'course_num': '15100'}
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for patcher in (mock.patch('image_cache.CACHE_DIR', tmp.name),
+                        mock.patch('db_pool.data_version', return_value = 'v1'),
+                        mock.patch('sys.stderr', new_callable = io.StringIO)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_failed_render_keeps_the_others(self):
+        wordcloud, time_graph, score = render_pipeline.image_keys(self.ARGS)[:3]
+        render_pipeline._collect([(wordcloud, done(error = ValueError('no words'))),
+                                  (time_graph, done(b'time')),
+                                  (score, done(b'score'))])
+        self.assertIsNone(image_cache.get(wordcloud))
+        self.assertEqual(image_cache.get(time_graph), b'time')
+        self.assertEqual(image_cache.get(score), b'score')
+
+    def test_empty_word_cloud_is_skipped(self):
+        executor = mock.Mock()
+        executor.submit.return_value = done(b'png')
+        keys = render_pipeline.image_keys(self.ARGS)
+        with mock.patch('render_pipeline.get_executor', return_value = executor), \
+                mock.patch('gen_wordcloud.get_wc_freqs', return_value = {}):
+            jobs = render_pipeline._submit(self.ARGS, None, set(keys))
+        self.assertEqual([key for key, job in jobs], keys[1:])
+
+
+class ImageCacheTests(SimpleTestCase):
+    '''
+    Checks that rendered images are kept on disk, per database version
+    '''
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch('image_cache.CACHE_DIR', tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dir = tmp.name
+
+    def test_put_and_get(self):
+        with mock.patch('db_pool.data_version', return_value = 'v1'):
+            key = image_cache.image_key('time', {'dept': 'MATH', 'course_num': '15100'})
+            self.assertIsNone(image_cache.get(key))
+            image_cache.put(key, b'png')
+            self.assertEqual(image_cache.get(key), b'png')
+            self.assertTrue(os.path.exists(os.path.join(self.dir, 'v1', key + '.png')))
+
+    def test_get_or_render(self):
+        render = mock.Mock(return_value = b'png')
+        with mock.patch('db_pool.data_version', return_value = 'v1'):
+            first = image_cache.get_or_render('time', {'prof_fn': 'Ann', 'prof_ln': 'Lee'}, render)
+            second = image_cache.get_or_render('time', {'prof_fn': 'Ann', 'prof_ln': 'Lee'}, render)
+        self.assertEqual(first, second)
+        render.assert_called_once_with({'prof_fn': 'Ann', 'prof_ln': 'Lee'})
+
+    def test_prune(self):
+        for version in ('v1', 'v2'):
+            with mock.patch('db_pool.data_version', return_value = version):
+                image_cache.put(image_cache.image_key('time', {}), b'png')
+        with mock.patch('db_pool.data_version', return_value = 'v2'):
+            image_cache.prune()
+        self.assertEqual(os.listdir(self.dir), ['v2'])
+
+    def test_least_recently_used_are_evicted(self):
+        with mock.patch('db_pool.data_version', return_value = 'v1'), \
+                mock.patch('image_cache.MAX_BYTES', 3000):
+            keys = [image_cache.image_key('time', {'n': n}) for n in range(4)]
+            for age, key in enumerate(keys[:3]):
+                image_cache.put(key, bytes(1000))
+                os.utime(image_cache.image_path(key), (100 + age, 100 + age))
+            image_cache.get(keys[0]) # used again, so keys[1] is now the oldest
+            image_cache.put(keys[3], bytes(1000))
+            self.assertEqual([image_cache.exists(key) for key in keys], [True, False, True, True])
+
+    def test_word_clouds_are_stored_once(self):
+        render = mock.Mock(return_value = b'png')
+        args = {'prof_fn': 'Ann', 'prof_ln': 'Lee'}
+        with mock.patch('db_pool.data_version', return_value = 'v1'), \
+                mock.patch('gen_wordcloud.render_wc', render):
+            self.assertEqual(gen_wordcloud.get_wc(args, {'proofs': 2}), b'png')
+            self.assertEqual(gen_wordcloud.get_wc(args, {'proofs': 2}), b'png')
+            # under the key the search page shows it by
+            self.assertEqual(image_cache.get(render_pipeline.image_keys(args)[0]), b'png')
+        render.assert_called_once_with({'proofs': 2}, gen_wordcloud.DEFAULT_RESOLUTION)
+        self.assertEqual(len(os.listdir(os.path.join(self.dir, 'v1'))), 1)
+
+    def test_pending_marks(self):
+        with mock.patch('db_pool.data_version', return_value = 'v1'):
+            key = image_cache.image_key('wordcloud', {'prof_fn': 'Ann', 'prof_ln': 'Lee'})
+            self.assertFalse(image_cache.is_pending(key))
+            self.assertTrue(image_cache.claim(key))
+            self.assertTrue(image_cache.is_pending(key))
+            self.assertFalse(image_cache.claim(key))
+            image_cache.release(key)
+            self.assertFalse(image_cache.is_pending(key))
+
+    def test_stale_pending_mark(self):
+        with mock.patch('db_pool.data_version', return_value = 'v1'):
+            key = image_cache.image_key('wordcloud', {'prof_fn': 'Ann', 'prof_ln': 'Lee'})
+            image_cache.claim(key)
+            old = time.time() - image_cache.PENDING_TIMEOUT - 1
+            os.utime(image_cache.image_path(key) + '.pending', (old, old))
+            self.assertFalse(image_cache.is_pending(key))
+            self.assertTrue(image_cache.claim(key))
+
+
+class FuzzyMatchTests(SimpleTestCase):
+    '''
+    Checks which misspelled or partial names are matched to a course or
+    professor, and which are too far from any
+    '''
+    def setUp(self):
+        self.db = make_db()
+        patcher = mock.patch('resources.ui_lists', return_value = lists_of(self.db))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for cache in (fuzzy._index, fuzzy._known):
+            cache.cache_clear()
+            self.addCleanup(cache.cache_clear)
+
+    def test_match_prof(self):
+        self.assertEqual(fuzzy.match_prof('Ann', 'Lee'), ('Ann', 'Lee'))
+        self.assertEqual(fuzzy.match_prof('ann', 'lee'), ('Ann', 'Lee'))
+        self.assertEqual(fuzzy.match_prof('Anne', 'Lee'), ('Ann', 'Lee'))
+        self.assertIsNone(fuzzy.match_prof('Zed', 'Quux'))
+
+    def test_threshold(self):
+        # 'Cyrus Parkinson' shares a third of its trigrams with 'Cy Park',
+        # 'Parkinson' alone fewer than THRESHOLD
+        self.assertEqual(fuzzy.match_prof('Cyrus', 'Parkinson'), ('Cy', 'Park'))
+        self.assertEqual(fuzzy.search('prof', 'Parkinson'), [])
+        self.assertEqual(fuzzy.search('prof', 'Anne Lee', threshold = 0.8), [])
+
+    def test_match_course_name(self):
+        self.assertEqual(fuzzy.match_course_name('MATH', 'Calculs'), ('MATH', '15100', 'Calculus I'))
+        self.assertEqual(fuzzy.match_course_name('CMSC', 'Computer Science'),
+                         ('CMSC', '15100', 'Intro to Computer Science'))
+        # only courses in the department are matched
+        self.assertIsNone(fuzzy.match_course_name('CMSC', 'Calculus I'))
+        self.assertIsNone(fuzzy.match_course_name('MATH', 'Topology'))
+
+    def test_converter_names_the_course_found(self):
+        with use_db(self.db):
+            self.assertEqual(convert_course_name_to_course_num('MATH', 'Analysis'), ('20300', 'Analysis'))
+            self.assertEqual(convert_course_name_to_course_num('MATH', 'Analysys'), ('20300', 'Analysis'))
+            self.assertEqual(convert_course_name_to_course_num('MATH', 'Topology'), (None, None))
+
+
+def prof_rows(rows):
+    return pd.DataFrame(rows, columns = ['course_id', 'fn', 'ln'])
+
+
+@needs_tosql
+class CleanResponsesTests(SimpleTestCase):
+    '''
+    Checks how tosql.py turns the responses to a question into words
+    '''
+    def test_punctuation_splits_words(self):
+        self.assertEqual(tosql.clean_responses(['Proofs,lemmas;definitions-theorems/examples',
+                                                'snake_case...really!']),
+                         'proofs lemmas definitions theorems examples snake case really')
+
+    def test_apostrophes(self):
+        self.assertEqual(tosql.clean_responses(["The prof's 9 o'clock lectures: 'students' favorite'"]),
+                         "prof's 9 o'clock lectures students favorite")
+
+    def test_stopwords(self):
+        self.assertIsInstance(tosql.STOPWORDS, frozenset)
+        self.assertIn('the', tosql.STOPWORDS)
+        for word in ('class', 'classes', 'professor', 'professors', 'course', 'courses', 'ta', 'tas'):
+            self.assertIn(word, tosql.STOPWORDS)
+        self.assertEqual(tosql.clean_responses(['The PROFESSORS taught the course well.',
+                                                'Great TAs; great class']),
+                         'taught well great great')
+
+    def test_unanswered(self):
+        for responses in (None, [], float('nan'), 'Great'):
+            with self.subTest(responses = responses):
+                self.assertIsNone(tosql.clean_responses(responses))
+
+
+@needs_tosql
+class NameStrippingTests(SimpleTestCase):
+    '''
+    Checks that the names of a course's professors are taken out of its
+    cleaned responses, however they are written
+    '''
+    def strip(self, profs, text, course_id = 'c1'):
+        patterns = tosql.prof_name_patterns(prof_rows(profs))
+        return tosql.strip_names(patterns[course_id], tosql.clean_responses([text])).split()
+
+    def test_hyphenated_name(self):
+        self.assertEqual(self.strip([('c1', 'Ann', 'Smith-Jones')],
+                                    'Smith-Jones explained proofs; ann smith jones rocks'),
+                         ['explained', 'proofs', 'rocks'])
+
+    def test_apostrophes(self):
+        self.assertEqual(self.strip([('c1', 'Liam', "D'Arcy"), ('c1', 'Kay', "O'Neil")],
+                                    "D'Arcy graded fairly. o'neil's notes helped"),
+                         ['graded', 'fairly', 'notes', 'helped'])
+
+    def test_possessive(self):
+        self.assertEqual(self.strip([('c1', 'Bo', 'Ng')], "Ng's lectures, Bo's jokes"),
+                         ['lectures', 'jokes'])
+
+    def test_overlapping_names(self):
+        profs = [('c1', 'Anne', 'Lee'), ('c1', 'Annette', 'Park')]
+        self.assertEqual(self.strip(profs, "Annette's labs, Anne's talks, Anneliese"),
+                         ['labs', 'talks', 'anneliese'])
+
+    def test_only_the_course_professors(self):
+        profs = [('c1', 'Ann', 'Lee'), ('c2', 'Bo', 'Ng')]
+        self.assertEqual(self.strip(profs, 'Ann Lee, Bo Ng'), ['bo', 'ng'])
+        self.assertEqual(self.strip(profs, 'Ann Lee, Bo Ng', 'c2'), ['ann', 'lee'])
+        self.assertNotIn('c3', tosql.prof_name_patterns(prof_rows([('c3', None, ' ')])))
+        self.assertIsNone(tosql.strip_names(tosql.prof_name_patterns(prof_rows(profs))['c1'], None))
+
+
+@needs_tosql
+class TermFreqsTests(SimpleTestCase):
+    '''
+    Checks the word counts the word clouds are summed from, on responses
+    run through tosql.py's text and term frequency steps
+    '''
+    def setUp(self):
+        self.db = make_db()
+        j = pd.DataFrame({
+            'course_responses': [['Weekly proofs, weekly quizzes'], ['proofs'], None,
+                                 ['Problem sets took forever.', 'Problem sets!']],
+            'instructor_responses': [['Clear lectures'], None, ['Clear, clear notes'],
+                                     ["Cy's office hours", 'lectures']]},
+            index = ['c1', 'c2', 'c3', 'c4'])
+        tosql.gen_text(j, self.db)
+        tosql.gen_term_freqs(self.db)
+
+    def freqs(self, query, **params):
+        return dict(queries.read_rows(self.db, query, dict(params, max_words = 200)))
+
+    def test_co_taught_course_counts_once(self):
+        # CMSC 15100 is taught by Ann Lee and Cy Park
+        self.assertEqual(self.freqs(queries.WC_COURSE_NUM, dept = 'CMSC', course_num = 15100),
+                         {'problem': 2, 'sets': 2, 'took': 1, 'forever': 1})
+        self.assertEqual(self.freqs(queries.WC_COURSE_NAME, dept = 'MATH',
+                                    course_name = 'Calculus I'),
+                         {'weekly': 2, 'proofs': 2, 'quizzes': 1})
+
+    def test_course_and_prof(self):
+        # "Cy's" is taken out, as the name of one of the course's professors
+        expected = {'problem': 2, 'sets': 2, 'took': 1, 'forever': 1, 'office': 1,
+                    'hours': 1, 'lectures': 1}
+        for fn, ln in (('Ann', 'Lee'), ('Cy', 'Park')):
+            with self.subTest(prof = ln):
+                self.assertEqual(self.freqs(queries.WC_COURSE_NUM_AND_PROF, dept = 'CMSC',
+                                            course_num = 15100, prof_fn = fn, prof_ln = ln),
+                                 expected)
+        self.assertEqual(self.freqs(queries.WC_COURSE_NAME_AND_PROF, dept = 'MATH',
+                                    course_name = 'Calculus I', prof_fn = 'Bo', prof_ln = 'Ng'),
+                         {'proofs': 1})
+
+    def test_prof(self):
+        self.assertEqual(self.freqs(queries.WC_PROF, prof_fn = 'Ann', prof_ln = 'Lee'),
+                         {'clear': 3, 'lectures': 2, 'notes': 1, 'office': 1, 'hours': 1})
+
+    def test_count_terms_matches_wordcloud(self):
+        from wordcloud import WordCloud
+        text = tosql.clean_responses(["The prof's notes were 100% worth it; it's a lot of "
+            "work, x y z, but the TA's office hours helped. Notes, notes, notes!",
+            "Don't skip section 2 or the weekly psets"])
+        cloud = WordCloud(collocations = False, normalize_plurals = False, min_word_length = 2)
+        self.assertEqual(dict(tosql.count_terms(text)), cloud.process_text(text))
+        self.assertEqual(tosql.count_terms(None), {})
+
+
+@needs_tosql
+class DeptCoursesTests(SimpleTestCase):
+    '''
+    Checks that dept_courses, built from courses and crosslists, returns each
+    evaluation once however many crosslist rows its course has
+    '''
+    def setUp(self):
+        self.db = make_db()
+        self.db.executescript('''
+            DROP TABLE dept_courses;
+            CREATE TABLE crosslists (course_id TEXT, crosslist TEXT);
+            INSERT INTO crosslists VALUES ('c1', NULL), ('c2', NULL), ('c3', NULL),
+                ('c4', 'MATH'), ('c4', 'STAT'), ('c4', 'MATH'), ('c5', NULL);
+            ''')
+        tosql.gen_dept_courses(self.db)
+
+    def evals(self, query, params):
+        return self.db.execute(query.format('evals.rowid, profs.fn, profs.ln'), params).fetchall()
+
+    def test_dept_courses(self):
+        self.assertEqual(sorted(self.db.execute('SELECT dept, course_id FROM dept_courses;')),
+                         [('CMSC', 'c4'), ('ENGL', 'c5'), ('MATH', 'c1'), ('MATH', 'c2'),
+                          ('MATH', 'c3'), ('MATH', 'c4'), ('STAT', 'c4')])
+
+    def test_each_eval_once(self):
+        # c4 has three crosslist rows, and two professors
+        searches = [(queries.DEPT, {'dept': 'MATH'}, 6), (queries.DEPT, {'dept': 'CMSC'}, 2),
+                    (queries.DEPT, {'dept': 'STAT'}, 2),
+                    (queries.COURSE_NUM, {'dept': 'MATH', 'course_num': 15100}, 5),
+                    (queries.COURSE_NUM_AND_PROF, {'dept': 'STAT', 'course_num': 15100,
+                                                   'prof_fn': 'Cy', 'prof_ln': 'Park'}, 1)]
+        for query, params, count in searches:
+            with self.subTest(params = params):
+                found = self.evals(query, params)
+                self.assertEqual(len(found), count)
+                self.assertEqual(len(set(found)), count)
+
+
+class ProfDeptsTests(SimpleTestCase):
+    '''
+    Checks the department each professor is compared to
+    '''
+    def setUp(self):
+        self.db = make_db()
+        # Cy Park teaches once in CMSC and then once in STAT
+        self.db.executescript('''
+            INSERT INTO courses VALUES ('c6', 'Statistical Methods', 22000, 'STAT', 1, 'Winter', 2018);
+            INSERT INTO profs VALUES ('c6', 'Park', 'Cy');
+            ''')
+
+    @needs_tosql
+    def test_gen_prof_depts(self):
+        tosql.gen_prof_depts(self.db)
+        # the department taught most often, and on a tie the one seen first, as
+        # statistics.mode picked on every search before
+        self.assertEqual(sorted(self.db.execute('SELECT fn, ln, dept FROM prof_depts;')),
+                         [('Ann', 'Lee', 'MATH'), ('Bo', 'Ng', 'MATH'), ('Cy', 'Park', 'CMSC'),
+                          ('Kay', "O'Neil", 'ENGL'), ('Liam', "D'Arcy", 'ENGL')])
+
+    def test_primary_depts(self):
+        names = [('Ann', 'Lee'), ('Liam', "D'Arcy"), ('Ann', 'Park'), ('Dee', 'Moss')]
+        with use_db(self.db):
+            depts = courses.get_profs_primary_depts(names)
+            one = courses.get_profs_primary_dept({'prof_fn': 'Dee', 'prof_ln': 'Moss'}, self.db)
+        self.assertEqual(depts, {('Ann', 'Lee'): 'MATH', ('Liam', "D'Arcy"): 'ENGL',
+                                 ('Ann', 'Park'): '', ('Dee', 'Moss'): ''})
+        self.assertEqual(one, '')
+
+
+@needs_tosql
+class DeptRankTests(SimpleTestCase):
+    '''
+    Checks that the dept_rank trigger keeps the table equal to aggregating
+    the evaluations from scratch
+    '''
+    AGGREGATE = '''SELECT courses.dept, COUNT(*), AVG(evals.avg_time), AVG(evals.prof_score)
+        FROM courses JOIN evals ON courses.course_id = evals.course_id
+        WHERE courses.dept IS NOT NULL
+        GROUP BY courses.dept ORDER BY courses.dept;'''
+
+    def rank(self, db):
+        return db.execute('''SELECT dept, num_evals, avg_time, prof_score
+            FROM dept_rank ORDER BY dept;''').fetchall()
+
+    def assertMatches(self, db):
+        found = self.rank(db)
+        expected = db.execute(self.AGGREGATE).fetchall()
+        self.assertEqual([row[:2] for row in found], [row[:2] for row in expected])
+        for row, want in zip(found, expected):
+            for value, wanted in zip(row[2:], want[2:]):
+                if wanted is None:
+                    self.assertIsNone(value, row[0])
+                else:
+                    self.assertAlmostEqual(value, wanted, msg = row[0])
+
+    def test_inserted_evals(self):
+        db = make_db()
+        db.execute("INSERT INTO courses VALUES ('c6', 'Topology', 26200, 'MATH', 1, 'Autumn', 2017);")
+        db.execute("INSERT INTO courses VALUES ('c7', 'Drawing', 10100, 'ARTV', 1, 'Autumn', 2017);")
+        tosql.gen_dept_rank(db)
+        self.assertMatches(db)
+
+        evals = ['c6', 'c7', 'c7', 'c1']
+        scores = [(3, 4.5), (None, None), (7, None), (None, 2)]
+        for course_id, (avg_time, prof_score) in zip(evals, scores):
+            db.execute('''INSERT INTO evals (course_id, avg_time, prof_score)
+                VALUES (?, ?, ?);''', (course_id, avg_time, prof_score))
+        self.assertMatches(db)
+        self.assertIn(('ARTV', 2, 7.0, None), self.rank(db))
@@ -0,0 +1,145 @@
+#-------------------------------------------------------------------------------
+# Name:        snapshot
+# Purpose:     Answers the department, course and professor evaluation
+#              queries from the Arrow files written by res/eval_snapshot.py
+#              instead of sqlite. The files are memory-mapped once per
+#              process, with an index of the rows each department, course
+#              and professor take up, so a search is a slice of the mapped
+#              columns rather than a query and a copy of every row.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/12/2018
+#-------------------------------------------------------------------------------
+
+import functools
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+
+import db_pool
+import queries
+from res import eval_snapshot
+
+# by_dept and by_prof are the mapped tables; depts, courses and profs map
+# each dept, (dept, course_num) and (fn, ln) to its (start, stop) rows
+Snapshot = namedtuple('Snapshot', ['by_dept', 'by_prof', 'depts', 'courses', 'profs'])
+
+
+def runs(*keys):
+    '''
+    Takes equal length arrays whose rows are sorted by those arrays and
+    returns a dictionary mapping each key (or tuple of keys) to the
+    (start, stop) range of the rows that hold it
+    '''
+    n = len(keys[0])
+    if n == 0:
+        return {}
+    change = np.zeros(n, dtype = bool)
+    change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(change)
+    stops = np.append(starts[1:], n)
+
+    if len(keys) == 1:
+        return {keys[0][s]: (s, e) for s, e in zip(starts, stops)}
+    return {tuple(key[s] for key in keys): (s, e) for s, e in zip(starts, stops)}
+
+
+@functools.lru_cache(maxsize = None)
+def load():
+    '''
+    Maps the snapshot files and indexes them on first use, and returns a
+    Snapshot, or None if the files are missing or were built from another
+    version of the database, in which case searches should use sqlite.
+    '''
+    by_dept = eval_snapshot.read_table(eval_snapshot.BY_DEPT_FILENAME)
+    by_prof = eval_snapshot.read_table(eval_snapshot.BY_PROF_FILENAME)
+    if by_dept is None or by_prof is None:
+        return None
+    version = db_pool.build_version()
+    if eval_snapshot.table_version(by_dept) != version or eval_snapshot.table_version(by_prof) != version:
+        return None
+    return index(by_dept, by_prof)
+
+
+def index(by_dept, by_prof):
+    '''
+    Takes the snapshot tables (see res/eval_snapshot.py) and returns them
+    as a Snapshot, with the rows of each department, course and professor
+    '''
+    depts = by_dept['dept'].to_numpy()
+    course_nums = by_dept['course_number'].to_numpy()
+    return Snapshot(by_dept, by_prof, runs(depts), runs(depts, course_nums),
+                    runs(by_prof['fn'].to_numpy(), by_prof['ln'].to_numpy()))
+
+
+def _rows(table, span):
+    '''
+    Returns the rows of table in span, a (start, stop) pair, without copying,
+    or no rows if span is None
+    '''
+    if span is None:
+        return table.slice(0, 0)
+    start, stop = span
+    return table.slice(start, stop - start)
+
+
+def _course_and_prof(snap, params):
+    course = _rows(snap.by_dept, snap.courses.get((params['dept'], params['course_num'])))
+    mask = pc.and_(pc.equal(course['fn'], params['prof_fn']),
+                   pc.equal(course['ln'], params['prof_ln']))
+    return course.filter(pc.fill_null(mask, False))
+
+
+# how each evaluation query in queries.py is answered from a Snapshot
+_LOOKUPS = {
+    queries.DEPT: lambda snap, params: _rows(snap.by_dept, snap.depts.get(params['dept'])),
+    queries.COURSE_NUM: lambda snap, params: _rows(snap.by_dept,
+        snap.courses.get((params['dept'], params['course_num']))),
+    queries.COURSE_NUM_AND_PROF: _course_and_prof,
+    queries.PROF: lambda snap, params: _rows(snap.by_prof,
+        snap.profs.get((params['prof_fn'], params['prof_ln']))),
+}
+
+
+def _column(table, name):
+    '''
+    Returns a column of table as a NumPy array. Numbers without missing
+    values are views of the mapped file; integers with missing values become
+    floats with NaN, and strings become objects, as pandas reads them from
+    sqlite.
+    '''
+    column = table.column(name)
+    if column.num_chunks == 1:
+        return column.chunk(0).to_numpy(zero_copy_only = False)
+    return column.to_numpy()
+
+
+def read(snap, query, params, columns = None, arrays = False):
+    '''
+    Answers one of queries.DEPT, COURSE_NUM, COURSE_NUM_AND_PROF and PROF
+    from snap. Returns a pandas DataFrame of the given columns (every column
+    if columns is None) like queries.read_evals, or if arrays is True, a
+    dictionary of arrays like queries.read_eval_arrays.
+
+    Raises ValueError for any other query or an unknown column
+    '''
+    if query not in _LOOKUPS:
+        raise ValueError('The snapshot cannot answer this query')
+    table = _LOOKUPS[query](snap, params)
+
+    if columns is None:
+        columns = [c for c in table.column_names if c not in eval_snapshot.KEY_COLUMNS]
+    unknown = [c for c in columns if c not in queries.EVAL_COLUMNS]
+    if unknown:
+        raise ValueError('Unknown evaluation columns: {}'.format(', '.join(unknown)))
+
+    if arrays:
+        return {c: _column(table, c).astype(queries.EVAL_COLUMNS[c][1], copy = False)
+                for c in columns}
+    return pd.DataFrame({c: _column(table, c) for c in columns}, columns = list(columns),
+                        copy = False)
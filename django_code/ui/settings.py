@@ -103,3 +103,17 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = (
     os.path.join(BASE_DIR, "static"),
 )
+
+
+# Search page
+
+# Set to True to return search results right away and render the word cloud
+# and graphs in the background; the page fetches each image once it is ready.
+# Finished and pending images are kept in rendered_images/, so the page may
+# fetch them from any server process, as long as every process shares that
+# folder. When False, every image is rendered before the results are returned.
+SEARCH_ASYNC_IMAGES = False
+
+# 'png' renders the time and score graphs on the server; 'json' sends their
+# data to the page and draws them in the browser.
+SEARCH_CHART_MODE = 'png'
@@ -0,0 +1,75 @@
+#-------------------------------------------------------------------------------
+# Name:        warm_wordclouds
+# Purpose:     Renders the word clouds for the most evaluated courses,
+#              professors and professors' courses into image_cache, so the
+#              first search for them does not have to wait for WordCloud. Run from the django_code folder after each
+#              tosql.py run:
+#
+#                  python3 warm_wordclouds.py [N]
+#
+#              N (default TOP_N) entities of each kind are rendered. Images
+#              saved for older versions of the database are deleted.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/12/2018
+#-------------------------------------------------------------------------------
+
+import sys
+import time
+
+import db_pool
+import queries
+import gen_wordcloud
+import image_cache
+import render_pipeline
+
+TOP_N = 100
+
+
+def top_searches(n):
+    '''
+    Returns search argument dictionaries, shaped like the ones built by the
+    search page, for the n most evaluated courses, professors and
+    professors' courses. There is no log of what people search for, so the
+    number of evaluations stands in for how often an entity is searched.
+    '''
+    with db_pool.connection() as db:
+        params = {'n': n}
+        courses = queries.read_rows(db, queries.TOP_COURSES, params)
+        profs = queries.read_rows(db, queries.TOP_PROFS, params)
+        course_profs = queries.read_rows(db, queries.TOP_COURSE_PROFS, params)
+
+    searches = [{'dept': dept, 'course_num': str(num)} for dept, num in courses]
+    searches += [{'prof_fn': fn, 'prof_ln': ln} for fn, ln in profs]
+    searches += [{'dept': dept, 'course_num': str(num), 'prof_fn': fn, 'prof_ln': ln}
+                 for dept, num, fn, ln in course_profs]
+    return searches
+
+
+def warm(n = TOP_N):
+    '''
+    Renders every word cloud from top_searches(n) that is not saved yet on
+    the render_pipeline worker pool. Returns the number rendered.
+    '''
+    image_cache.prune()
+
+    jobs = []
+    for args in top_searches(n):
+        if image_cache.exists(gen_wordcloud.cache_key(args)):
+            continue
+        freqs = gen_wordcloud.get_wc_freqs(args)
+        if freqs: # WordCloud cannot draw an empty cloud
+            jobs.append(render_pipeline.get_executor().submit(gen_wordcloud.get_wc,
+                args, freqs))
+
+    for job in jobs:
+        job.result()
+    return len(jobs)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else TOP_N
+    start = time.time()
+    rendered = warm(n)
+    print('rendered {} word clouds in {:.1f}s'.format(rendered, time.time() - start))
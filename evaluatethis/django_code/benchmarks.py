@@ -0,0 +1,165 @@
+#-------------------------------------------------------------------------------
+# Name:        benchmarks
+# Purpose:     Timing comparisons for the query and rendering code used by
+#              the website. Run from the django_code folder against a built
+#              reevaluations.db:
+#
+#                  python3 benchmarks.py [name ...]
+#
+#              With no names, every benchmark is run.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/11/2018
+#-------------------------------------------------------------------------------
+
+import sys
+import timeit
+
+from wordcloud import WordCloud
+
+import db_pool
+import queries
+import graphs
+import gen_wordcloud
+import warm_wordclouds
+import response_search
+import render_pipeline
+import snapshot
+import eval_store
+
+REPEAT = 5
+
+# the department query as it was written before the 'dept_courses' table,
+# joining every crosslist row
+CROSSLIST_JOIN_DEPT = '''SELECT evals.*, course, year, term, fn, ln
+    FROM courses JOIN profs JOIN evals JOIN crosslists
+    ON courses.course_id = evals.course_id
+    AND courses.course_id = crosslists.course_id
+    AND courses.course_id = profs.course_id
+    WHERE (courses.dept = :dept OR crosslists.crosslist = :dept);'''
+
+
+def best_time(f, number = 1):
+    '''
+    Returns the best time in milliseconds of REPEAT runs of f
+    '''
+    return min(timeit.repeat(f, number = number, repeat = REPEAT)) / number * 1000
+
+
+def largest_depts(db, n = 5):
+    '''
+    Returns the n departments with the most member courses
+    '''
+    rows = db.execute('''SELECT dept FROM dept_courses GROUP BY dept
+        ORDER BY COUNT(*) DESC LIMIT ?;''', (n,)).fetchall()
+    return [r[0] for r in rows]
+
+
+def bench_dept_queries():
+    '''
+    Compares the crosslist JOIN department query with the 'dept_courses'
+    version on the largest departments
+    '''
+    print('{:<8}{:>12}{:>12}{:>12}{:>12}'.format('dept', 'join rows',
+        'join ms', 'rows', 'ms'))
+    with db_pool.connection() as db:
+        for dept in largest_depts(db):
+            params = {'dept': dept}
+            dept_query = queries.project(queries.DEPT)
+            old_rows = len(queries.read_rows(db, CROSSLIST_JOIN_DEPT, params))
+            new_rows = len(queries.read_rows(db, dept_query, params))
+            old_ms = best_time(lambda: queries.read_df(db, CROSSLIST_JOIN_DEPT, params))
+            new_ms = best_time(lambda: queries.read_df(db, dept_query, params))
+            print('{:<8}{:>12}{:>12.1f}{:>12}{:>12.1f}'.format(dept, old_rows,
+                old_ms, new_rows, new_ms))
+
+
+def matplotlib_wc(freqs):
+    '''
+    Renders a word cloud the way get_wc did before RESOLUTIONS: laid out at
+    2000x700 and then drawn again through matplotlib
+    '''
+    wc = WordCloud(width = 2000, height = 700,
+        max_words = gen_wordcloud.MAX_WORDS).generate_from_frequencies(freqs)
+    fig, ax = graphs.new_figure((20, 7))
+    ax.imshow(wc)
+    ax.axis("off")
+    return graphs.save_png(fig)
+
+
+def bench_wordcloud():
+    '''
+    Compares rendering the word cloud of a few popular searches through
+    matplotlib with saving it straight from WordCloud at each resolution
+    '''
+    renders = [('matplotlib', matplotlib_wc)]
+    renders += [(resolution, lambda freqs, r = resolution: gen_wordcloud.render_wc(freqs, r))
+                for resolution in sorted(gen_wordcloud.RESOLUTIONS)]
+
+    print('{:<40}'.format('search') + ''.join('{:>12}'.format(name) for name, _ in renders))
+    for args in warm_wordclouds.top_searches(1):
+        freqs = gen_wordcloud.get_wc_freqs(args)
+        times = [best_time(lambda: render(freqs)) for _, render in renders]
+        print('{:<40}'.format(' '.join(args.values())) +
+              ''.join('{:>10.0f}ms'.format(ms) for ms in times))
+
+
+def bench_response_search():
+    '''
+    Times the first and a later page of keyword searches over every
+    evaluation's responses
+    '''
+    print('{:<20}{:>12}{:>12}'.format('keywords', 'page 1 ms', 'page 10 ms'))
+    for keywords in ['curve', 'problem sets', 'office hours', 'boring lecture']:
+        first = best_time(lambda: response_search.search_responses(keywords), number = 10)
+        later = best_time(lambda: response_search.search_responses(keywords, 10), number = 10)
+        print('{:<20}{:>12.2f}{:>12.2f}'.format(keywords, first, later))
+
+
+def bench_snapshot():
+    '''
+    Compares reading the evaluations the search page graphs need from sqlite
+    with slicing them from the memory-mapped snapshot and looking them up in
+    the in-memory store, for the largest departments and the most evaluated
+    courses and professors
+    '''
+    snap = snapshot.load()
+    if snap is None:
+        print('No snapshot for this database; run res/eval_snapshot.py first')
+        return
+    store = eval_store.load()
+
+    columns = render_pipeline.COLUMNS
+    with db_pool.connection() as db:
+        searches = [(queries.DEPT, {'dept': dept}) for dept in largest_depts(db)]
+        searches += [(queries.COURSE_NUM, {'dept': dept, 'course_num': str(num)})
+                     for dept, num in queries.read_rows(db, queries.TOP_COURSES, {'n': 3})]
+        searches += [(queries.PROF, {'prof_fn': fn, 'prof_ln': ln})
+                     for fn, ln in queries.read_rows(db, queries.TOP_PROFS, {'n': 3})]
+
+        print('{:<30}{:>8}{:>12}{:>14}{:>11}{:>11}'.format('search', 'rows', 'sqlite ms',
+            'snapshot ms', 'store ms', 'find ms'))
+        for query, params in searches:
+            rows = len(queries.read_evals(db, query, params, columns))
+            sqlite_ms = best_time(lambda: queries.read_evals(db, query, params, columns), number = 10)
+            snapshot_ms = best_time(lambda: snapshot.read(snap, query, params, columns), number = 10)
+            store_ms = best_time(lambda: eval_store.read(store, query, params, columns), number = 10)
+            find_ms = best_time(lambda: eval_store.find(store, query, params, columns), number = 100)
+            print('{:<30}{:>8}{:>12.2f}{:>14.2f}{:>11.2f}{:>11.3f}'.format(
+                ' '.join(params.values()), rows, sqlite_ms, snapshot_ms, store_ms, find_ms))
+
+
+BENCHMARKS = {
+    'dept_queries': bench_dept_queries,
+    'wordcloud': bench_wordcloud,
+    'response_search': bench_response_search,
+    'snapshot': bench_snapshot,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print('== {} =='.format(name))
+        BENCHMARKS[name]()
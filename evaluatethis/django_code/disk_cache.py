@@ -0,0 +1,80 @@
+#-------------------------------------------------------------------------------
+# Name:        disk_cache
+# Purpose:     Reads and writes the files the website keeps on disk between
+#              requests, such as rendered images. Files are written under a
+#              temporary name and renamed, so every server process can share
+#              them, and the folders they are kept in can be held to a size
+#              by deleting the files that were used least recently.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/12/2018
+#-------------------------------------------------------------------------------
+
+import os
+import shutil
+
+
+def read(path):
+    '''
+    Returns the bytes saved at path, or None if there are none. The file's
+    modification time is set to now, so trim keeps the files in use.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return data
+
+
+def write(path, data):
+    '''
+    Saves bytes at path. The file is written under a temporary name and
+    then renamed, so a reader never sees half a file. The cache is only an
+    optimization, so a folder that cannot be written to is ignored.
+    '''
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def prune(folder, keep):
+    '''
+    Deletes every folder inside folder but keep
+    '''
+    if not os.path.isdir(folder):
+        return
+    for name in os.listdir(folder):
+        if name != keep:
+            shutil.rmtree(os.path.join(folder, name), ignore_errors = True)
+
+
+def trim(folder, max_bytes, suffix):
+    '''
+    Deletes the files in folder whose names end with suffix, least recently
+    read or written first, until they take up at most max_bytes
+    '''
+    try:
+        entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                   for entry in os.scandir(folder) if entry.name.endswith(suffix)]
+    except OSError:
+        return
+    total = sum(size for mtime, size, path in entries)
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
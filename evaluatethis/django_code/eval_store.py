@@ -0,0 +1,163 @@
+#-------------------------------------------------------------------------------
+# Name:        eval_store
+# Purpose:     Keeps every evaluation in memory in compact columns, built
+#              once per process: scores and times as float32, whole numbers
+#              as int16 where they fit, and strings as small integer codes
+#              into one array of each column's distinct values. Rows are
+#              kept in the orders of res/eval_snapshot.py, with the range of
+#              rows of each department, course and professor, so a search
+#              is a slice of each column it needs.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/12/2018
+#-------------------------------------------------------------------------------
+
+import functools
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+import db_pool
+import queries
+import snapshot
+from res import eval_snapshot
+
+# arrays maps each column to its values, or for strings to their codes;
+# values maps each string column to its distinct values, followed by None
+# so that the code -1 reads as a missing value
+Block = namedtuple('Block', ['arrays', 'values'])
+
+# by_dept and by_prof hold the rows in the orders of the snapshot files;
+# depts, courses and profs map each dept, (dept, course_num) and (fn, ln)
+# to its (start, stop) rows. Course numbers are text, as the search form and
+# course_name_converter give them.
+Store = namedtuple('Store', ['by_dept', 'by_prof', 'depts', 'courses', 'profs'])
+
+INT16 = np.iinfo(np.int16)
+
+
+def encode(column):
+    '''
+    Takes an Arrow column and returns its compact array, and for strings
+    also the array of distinct values its codes index into (otherwise None)
+    '''
+    if pa.types.is_string(column.type):
+        codes, uniques = pd.factorize(column.to_numpy())
+        values = np.append(np.asarray(uniques, dtype = object), None)
+        code_type = np.int16 if len(values) <= INT16.max else np.int32
+        return codes.astype(code_type), values
+
+    numbers = column.to_numpy()
+    if (pa.types.is_integer(column.type) and column.null_count == 0
+            and (len(numbers) == 0 or INT16.min <= numbers.min() <= numbers.max() <= INT16.max)):
+        return numbers.astype(np.int16), None
+    return numbers.astype(np.float32), None
+
+
+def build_block(table):
+    '''
+    Takes one of the snapshot tables and returns its columns as a Block
+    '''
+    arrays = {}
+    values = {}
+    for name in table.column_names:
+        arrays[name], strings = encode(table.column(name))
+        if strings is not None:
+            values[name] = strings
+    return Block(arrays, values)
+
+
+def decode(block, name, rows):
+    '''
+    Returns the column name of block for rows (a slice or an array of
+    positions). Numbers are views when rows is a slice; strings are read
+    from the column's distinct values, so no new string objects are made.
+    '''
+    if name in block.values:
+        return block.values[name][block.arrays[name][rows]]
+    return block.arrays[name][rows]
+
+
+def build_store(by_dept, by_prof):
+    '''
+    Takes the snapshot tables (see res/eval_snapshot.py) and returns a Store
+    '''
+    by_dept = build_block(by_dept)
+    by_prof = build_block(by_prof)
+    depts = decode(by_dept, 'dept', slice(None))
+    course_nums = decode(by_dept, 'course_number', slice(None))
+    return Store(by_dept, by_prof, snapshot.runs(depts), snapshot.runs(depts, course_nums),
+                 snapshot.runs(decode(by_prof, 'fn', slice(None)), decode(by_prof, 'ln', slice(None))))
+
+
+@functools.lru_cache(maxsize = None)
+def load():
+    '''
+    Builds the Store on first use, from the memory-mapped snapshot if there
+    is one for this database and from sqlite otherwise, and then keeps it
+    '''
+    snap = snapshot.load()
+    if snap is not None:
+        return build_store(snap.by_dept, snap.by_prof)
+    with db_pool.connection() as db:
+        return build_store(eval_snapshot.build_table(db, eval_snapshot.BY_DEPT),
+                           eval_snapshot.build_table(db, eval_snapshot.BY_PROF))
+
+
+def _span(span):
+    if span is None:
+        return slice(0, 0)
+    return slice(*span)
+
+
+def _course_and_prof(store, params):
+    block = store.by_dept
+    rows = _span(store.courses.get((params['dept'], params['course_num'])))
+    match = ((decode(block, 'fn', rows) == params['prof_fn'])
+             & (decode(block, 'ln', rows) == params['prof_ln']))
+    return block, np.arange(rows.start, rows.stop)[match]
+
+
+# how each evaluation query in queries.py is answered from a Store, as a
+# block and the rows of it the query returns
+_LOOKUPS = {
+    queries.DEPT: lambda store, params: (store.by_dept,
+        _span(store.depts.get(params['dept']))),
+    queries.COURSE_NUM: lambda store, params: (store.by_dept,
+        _span(store.courses.get((params['dept'], params['course_num'])))),
+    queries.COURSE_NUM_AND_PROF: _course_and_prof,
+    queries.PROF: lambda store, params: (store.by_prof,
+        _span(store.profs.get((params['prof_fn'], params['prof_ln'])))),
+}
+
+
+def find(store, query, params, columns):
+    '''
+    Answers one of queries.DEPT, COURSE_NUM, COURSE_NUM_AND_PROF and PROF
+    from store, returning a dictionary mapping each of columns to its array.
+    Numbers are views of the store's float32 or int16 columns, except for a
+    course and professor search, which picks its rows out of the course.
+
+    Raises ValueError for any other query or an unknown column
+    '''
+    if query not in _LOOKUPS:
+        raise ValueError('The store cannot answer this query')
+    unknown = [c for c in columns if c not in queries.EVAL_COLUMNS]
+    if unknown:
+        raise ValueError('Unknown evaluation columns: {}'.format(', '.join(unknown)))
+
+    block, rows = _LOOKUPS[query](store, params)
+    return {c: decode(block, c, rows) for c in columns}
+
+
+def read(store, query, params, columns, arrays = False):
+    '''
+    Like find, but returns a pandas DataFrame unless arrays is True
+    '''
+    found = find(store, query, params, columns)
+    if arrays:
+        return found
+    return pd.DataFrame(found, columns = list(columns), copy = False)
@@ -7,12 +7,18 @@
 #
 # Created:     03/04/2018
 #-------------------------------------------------------------------------------
+import io
 import courses
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# the only evaluation columns the time graphs use
+COLUMNS = ('low_time', 'avg_time', 'high_time', 'course', 'year', 'fn', 'ln')
+# the columns that make up each bar
+TIME_COLUMNS = ['low_time', 'avg_time', 'high_time']
+
 '''
 get the necessary data given args from ui
 this assumes that you can search by prof, dept, or course number
@@ -20,63 +26,155 @@ if you search by prof, you don't want info about a specific course
 if you search by dept, you don't want info about a specific course or prof
 '''
 
-def graph_it(args_from_ui):
+def graph_it(args_from_ui, results = None, as_json = False):
     '''
     Given arguments from the user, calls the appropriate graphing function to create a time
-    comparison graph. 
+    comparison graph. Returns the graph as PNG bytes, or if as_json is True, the data for
+    the graph as a dictionary that can be drawn in the browser (see chart_json).
+    results may hold what courses.find_courses returned for args_from_ui (with at least
+    COLUMNS), so that several graphs can share one query.
     '''
     if len(args_from_ui) == 2:
         if "prof_fn" in args_from_ui and "prof_ln" in args_from_ui:
-            prof_graph(args_from_ui)
+            return prof_graph(args_from_ui, results, as_json)
         elif "dept" in args_from_ui:
-            course_graph(args_from_ui)
+            return course_graph(args_from_ui, results, as_json)
     else:
-        course_prof_graph(args_from_ui)
+        return course_prof_graph(args_from_ui, results, as_json)
+
+
+def new_figure(figsize = (20, 7)):
+    '''
+    Creates a figure with a single set of axes drawn on its own Agg canvas.
+    Figures made this way are not tracked by pyplot, so they can be rendered
+    from several threads at once and are freed as soon as they go out of scope.
+    '''
+    fig = Figure(figsize = figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    return fig, ax
+
+
+def save_png(fig):
+    '''
+    Renders a figure to PNG bytes
+    '''
+    buf = io.BytesIO()
+    fig.savefig(buf, format = 'png')
+    return buf.getvalue()
+
+
+def chart_json(chart_type, title, ylabel, labels, series, ymax = None):
+    '''
+    Packs the data behind a bar graph into a dictionary that the search page
+    draws itself, instead of shipping a rendered PNG
+
+      - chart_type is 'range' (low/average/high bars drawn over each other)
+        or 'grouped' (one bar per series, side by side)
+      - labels is a list of bar group names
+      - series is a list of (name, values) pairs, one value per label
+
+    Missing values become None and the rest are rounded to two places.
+    '''
+    def clean(values):
+        return [None if pd.isnull(v) else round(float(v), 2) for v in values]
+
+    return {'type': chart_type, 'title': title, 'ylabel': ylabel,
+            'labels': [str(label) for label in labels], 'ymax': ymax,
+            'series': [{'name': name, 'values': clean(values)} for name, values in series]}
+
+
+def time_chart(lows, avgs, highs, title, as_json):
+    '''
+    Returns the time graph for the given lists as PNG bytes, or as a dictionary
+    from chart_json if as_json is True
+    '''
+    if as_json:
+        return chart_json('range', title, 'Amount of time spent', list(lows.axes[0]),
+                          [('Low', lows), ('Average', avgs), ('High', highs)])
+    return save_png(time_graph(lows, avgs, highs, title))
+
 
+# graphs show at most this many courses or professors
+MAX_GROUPS = 10
 
 def get_small_df(dataframe, prof_or_course):
     '''
     Drops successive years until the number of bars in the graph will be no more than 10. 
+    Returns the mean of each column per course ("prof") or professor ("course") and the
+    first year kept.
     '''
     current_year = 2018
     timespan = 5
+    # years to start from, tried in order, before giving up
+    cutoffs = [current_year - span for span in range(timespan - 1, 1, -1)]
+
     if prof_or_course == "prof":
-        while dataframe.course.unique().shape[0] > 10:
-            timespan -= 1
-            if timespan == 1:
-                break
-            dataframe = dataframe[dataframe.year >= current_year - timespan]
-        dataframe = dataframe.groupby(['course']).mean()
+        by = 'course'
 
     if prof_or_course == "course":
-        dataframe['prof_name'] = dataframe['fn'].astype('str') + ' ' + dataframe['ln']
-        while dataframe.prof_name.unique().shape[0] > 10:
-            timespan -= 1
-            if timespan == 1:
-                break
-            dataframe = dataframe[dataframe.year >= current_year - timespan]
-        dataframe = dataframe.groupby(['prof_name']).mean()
+        dataframe = dataframe.assign(prof_name = dataframe['fn'].astype('str') + ' ' + dataframe['ln'])
+        by = 'prof_name'
 
-    return dataframe, current_year - timespan
+    # when every year has been dropped and there are still too many bars, the
+    # year after the last cutoff is given, as it always has been
+    dataframe, cutoff = window_means(dataframe, by, cutoffs, MAX_GROUPS, last = current_year - 1)
+    return dataframe, cutoff if cutoff is not None else current_year - timespan
 
-def time_lists(small_df, dept_df, dept):
+def window_means(df, by, cutoffs, max_groups, last = None):
     '''
-    Creates lists of low, average, and high time demands for courses and departments. 
+    Groups the evaluations in df by the column by and returns the mean of
+    each numeric column for every group, over the evaluations from the
+    first year in cutoffs since which at most max_groups groups have been
+    taught. Every evaluation is used if there are few enough groups
+    already, and those since the last cutoff if no cutoff is late enough.
+
+    The number of groups taught since each cutoff comes from every group's
+    latest year in one vectorized pass, so df is filtered and grouped once.
+
+    Returns the means and the cutoff year used (None if none was needed, and
+    last, if given, when no cutoff is late enough)
     '''
+    cutoff = None
+    if cutoffs and df[by].nunique(dropna = False) > max_groups:
+        latest = df.groupby(by, dropna = False)['year'].max().to_numpy()
+        taught = (latest[:, np.newaxis] >= np.asarray(cutoffs)).sum(axis = 0)
+        small = np.flatnonzero(taught <= max_groups)
+        cutoff = cutoffs[small[0]] if len(small) else cutoffs[-1]
+        df = df[df['year'] >= cutoff]
+        if not len(small) and last is not None:
+            cutoff = last
+    return df.groupby(by).mean(numeric_only = True), cutoff
 
-    lows = small_df.low_time
-    dept_low = dept_df.low_time.mean()
-    lows = lows.append(pd.Series({dept:dept_low}))
+def compare_means(groups, columns, entities = None):
+    '''
+    Returns one dataframe holding a row of means of the given columns per bar in a
+    comparison graph. entities, if given, is a dataframe that already holds one row per
+    course or professor; its rows come first, in order. Then comes one row per
+    (label, dataframe) pair in groups, averaged over that dataframe. All the rows are
+    stacked under their bar's position and averaged in a single groupby, and a bar
+    with no evaluations is left as NaN.
+    '''
+    if entities is None:
+        entities = pd.DataFrame(columns = columns)
+    n = len(entities)
+    labels = list(entities.index) + [label for label, df in groups]
 
-    avgs = small_df.avg_time
-    dept_avg = dept_df.avg_time.mean()
-    avgs = avgs.append(pd.Series({dept:dept_avg}))
+    parts = [entities[columns].set_axis(np.arange(n), axis = 0)]
+    for key, (label, df) in enumerate(groups, n):
+        parts.append(df[columns].set_axis(np.full(len(df), key), axis = 0))
+    stacked = pd.concat(parts).astype(float)
 
-    highs = small_df.high_time
-    dept_high = dept_df.high_time.mean()
-    highs = highs.append(pd.Series({dept:dept_high}))
+    means = stacked.groupby(level = 0).mean().reindex(np.arange(len(labels)))
+    means.index = labels
+    return means
 
-    return lows, avgs, highs
+def time_lists(small_df, dept_df, dept):
+    '''
+    Creates lists of low, average, and high time demands for courses and departments. 
+    '''
+    means = compare_means([(dept, dept_df)], TIME_COLUMNS, small_df)
+    return means.low_time, means.avg_time, means.high_time
 
 def time_graph(lows, avgs, highs, title):
     '''
@@ -87,45 +185,48 @@ def time_graph(lows, avgs, highs, title):
     n = lows.shape[0]
     ind = np.arange(n)
     width = 0.2
-    plt.figure(figsize = (20, 7))
-    p1 = plt.bar(ind, lows, width, color='#d62728')
-    p2 = plt.bar(ind, avgs, width,
+    fig, ax = new_figure((20, 7))
+    p1 = ax.bar(ind, lows, width, color='#d62728')
+    p2 = ax.bar(ind, avgs, width,
              bottom=lows, color = '#f442cb')
-    p3 = plt.bar(ind, avgs, width,
+    p3 = ax.bar(ind, avgs, width,
              bottom=avgs, color = '#63cbe8')
-    plt.ylabel('Amount of time spent', fontsize = 15)
-    plt.title(title)
+    ax.set_ylabel('Amount of time spent', fontsize = 15)
+    ax.set_title(title)
     xnames = list(lows.axes[0])
-    plt.xticks(ind, xnames, rotation = 10, fontsize = 10, ha = 'left')
-    plt.legend((p1[0], p2[0], p3[0]), ('Low', 'Average', 'High'))
-    plt.tight_layout()
-    return plt
-    plt.savefig('./static/images/graph.png')
+    ax.set_xticks(ind)
+    ax.set_xticklabels(xnames, rotation = 10, fontsize = 10, ha = 'left')
+    ax.legend((p1[0], p2[0], p3[0]), ('Low', 'Average', 'High'))
+    fig.tight_layout()
+    return fig
 
 
-def prof_graph(args_from_ui):
+def prof_graph(args_from_ui, results = None, as_json = False):
     '''
     If the user searches by professor only, this code will produce a graph comparing
     the time demands of every course the professor has taught to the department average
     time demands.
     '''
-    prof_df, dept_df, dept = courses.find_courses(args_from_ui)
+    if results is None:
+        results = courses.find_courses(args_from_ui, COLUMNS)
+    prof_df, dept_df, dept = results
     title = "Comparison of the time demands made by " + args_from_ui['prof_fn'] + ' ' + args_from_ui['prof_ln'] + " to the departmental average"
     small_df, year = get_small_df(prof_df, "prof")
     if 'high_time' in small_df:
         small_df = small_df.sort_values(by = 'high_time', axis = 0, ascending = False)
     lows, avgs, highs = time_lists(small_df, dept_df, dept)
-    graph = time_graph(lows, avgs, highs, title)
-    plt.savefig('./static/images/graph.png')
+    return time_chart(lows, avgs, highs, title, as_json)
 
 
-def course_graph(args_from_ui):
+def course_graph(args_from_ui, results = None, as_json = False):
     '''
     If the user searches by course and department, this code will produce a graph that compares the time 
     demands made by each professor who taught the course compared to the department average 
     time demands. If the course is crosslisted, this may also include the average time demands of the other department(s).
     '''
-    course_df, dept_df = courses.find_courses(args_from_ui)
+    if results is None:
+        results = courses.find_courses(args_from_ui, COLUMNS)
+    course_df, dept_df = results
     
     title = "Time demands made by instructors of " + args_from_ui['dept'] + " " + args_from_ui['course_num'] + " w/ departmental average"
     dept = args_from_ui['dept']
@@ -133,40 +234,25 @@ def course_graph(args_from_ui):
     if 'high_time' in small_df:
         small_df = small_df.sort_values(by = 'high_time', axis = 0, ascending = False)
     lows, avgs, highs = time_lists(small_df, dept_df, dept)
-    graph = time_graph(lows, avgs, highs, title)
-    plt.savefig('./static/images/graph.png')
+    return time_chart(lows, avgs, highs, title, as_json)
 
 
-def course_prof_graph(args_from_ui):
+def course_prof_graph(args_from_ui, results = None, as_json = False):
     '''
     If the user searches by course and professor, this code will produce a graph that compares the time 
     demands made by this professor averaged over every time they taught the course, the time demands made by
     other professors who  have taught this course, departmental average time demands, and this professor's average
     time demands.
     '''
-    course_and_prof_df, dept_df, course_df, prof_df = courses.find_courses(args_from_ui)
+    if results is None:
+        results = courses.find_courses(args_from_ui, COLUMNS)
+    course_and_prof_df, dept_df, course_df, prof_df = results
     dept = args_from_ui['dept']
     course = dept + " " + args_from_ui['course_num']
     prof = args_from_ui['prof_fn'] + " " + args_from_ui['prof_ln']
     course_and_prof = prof + " and " + course
     title = "Time demands for " + course + ' taught by ' + prof + ' with related time demands'
-    lows = pd.Series({course_and_prof:course_and_prof_df.low_time.mean()})
-    avgs = pd.Series({course_and_prof:course_and_prof_df.avg_time.mean()})
-    highs = pd.Series({course_and_prof:course_and_prof_df.high_time.mean()})
-    
-    lows = lows.append(pd.Series({dept:dept_df.low_time.mean()}))
-    avgs = avgs.append(pd.Series({dept:dept_df.avg_time.mean()}))
-    highs = highs.append(pd.Series({dept:dept_df.high_time.mean()}))
-
-    lows = lows.append(pd.Series({course:course_df.low_time.mean()}))
-    avgs = avgs.append(pd.Series({course:course_df.avg_time.mean()}))
-    highs = highs.append(pd.Series({course:course_df.high_time.mean()}))
-
-
-    lows = lows.append(pd.Series({prof:prof_df.low_time.mean()}))
-    avgs = avgs.append(pd.Series({prof:prof_df.avg_time.mean()}))
-    highs = highs.append(pd.Series({prof:prof_df.high_time.mean()}))
-
-    graph = time_graph(lows, avgs, highs, title)
-    plt.savefig('./static/images/graph.png')
+    means = compare_means([(course_and_prof, course_and_prof_df), (dept, dept_df),
+                           (course, course_df), (prof, prof_df)], TIME_COLUMNS)
 
+    return time_chart(means.low_time, means.avg_time, means.high_time, title, as_json)
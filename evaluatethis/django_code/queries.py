@@ -0,0 +1,296 @@
+#-------------------------------------------------------------------------------
+# Name:        queries
+# Purpose:     Holds every SQL statement the website runs against the
+#              evaluations database. Statements are fixed strings with bound
+#              parameters, so sqlite's per-connection statement cache can
+#              reuse the compiled statement across requests, and names with
+#              apostrophes are passed through untouched.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/10/2018
+#-------------------------------------------------------------------------------
+
+import functools
+import numpy as np
+import pandas as pd
+
+# Columns that callers of the evaluation queries below may ask for, with the
+# qualified column to select and the NumPy dtype used by read_eval_arrays.
+# Nullable numbers are read as floats so that NULL becomes NaN.
+EVAL_COLUMNS = {
+    'course_id': ('evals.course_id', object),
+    'prof_score': ('evals.prof_score', np.float64),
+    'ass_score': ('evals.ass_score', np.float64),
+    'over_score': ('evals.over_score', np.float64),
+    'test_score': ('evals.test_score', np.float64),
+    'read_score': ('evals.read_score', np.float64),
+    'num_responses': ('evals.num_responses', np.float64),
+    'low_time': ('evals.low_time', np.float64),
+    'avg_time': ('evals.avg_time', np.float64),
+    'high_time': ('evals.high_time', np.float64),
+    'num_recommend': ('evals.num_recommend', np.float64),
+    'num_dont_recommend': ('evals.num_dont_recommend', np.float64),
+    'inst_sentiment': ('evals.inst_sentiment', np.float64),
+    'course_sentiment': ('evals.course_sentiment', np.float64),
+    'good_inst': ('evals.good_inst', np.float64),
+    'bad_inst': ('evals.bad_inst', np.float64),
+    'would_like_inst': ('evals.would_like_inst', object),
+    'would_recommend': ('evals.would_recommend', object),
+    'course': ('courses.course', object),
+    'year': ('courses.year', np.float64),
+    'term': ('courses.term', object),
+    'fn': ('profs.fn', object),
+    'ln': ('profs.ln', object),
+}
+
+# what the evaluation queries select when no columns are given
+ALL_EVAL_COLUMNS = 'evals.*, course, year, term, fn, ln'
+
+
+# The evaluation queries below leave their select list as {} so that
+# project() can fill in just the columns a caller needs.
+#
+# Department membership, including crosslistings, comes from the
+# 'dept_courses' table built by tosql.py. It holds each (dept, course_id)
+# pair once, so an evaluation is not repeated for every crosslist row.
+COURSE_NUM_AND_PROF = '''SELECT {}
+    FROM dept_courses JOIN courses JOIN profs JOIN evals
+    ON dept_courses.course_id = courses.course_id
+    AND courses.course_id = evals.course_id
+    AND courses.course_id = profs.course_id
+    WHERE dept_courses.dept = :dept
+    AND courses.course_number = :course_num
+    AND profs.fn = :prof_fn
+    AND profs.ln = :prof_ln;'''
+
+COURSE_NAME_AND_PROF = '''SELECT {}
+    FROM dept_courses JOIN courses JOIN profs JOIN evals
+    ON dept_courses.course_id = courses.course_id
+    AND courses.course_id = evals.course_id
+    AND courses.course_id = profs.course_id
+    WHERE dept_courses.dept = :dept
+    AND courses.course = :course_name
+    AND profs.fn = :prof_fn
+    AND profs.ln = :prof_ln;'''
+
+COURSE_NUM = '''SELECT {}
+    FROM dept_courses JOIN courses JOIN profs JOIN evals
+    ON dept_courses.course_id = courses.course_id
+    AND courses.course_id = evals.course_id
+    AND courses.course_id = profs.course_id
+    WHERE dept_courses.dept = :dept
+    AND courses.course_number = :course_num;'''
+
+COURSE_NAME = '''SELECT {}
+    FROM dept_courses JOIN courses JOIN profs JOIN evals
+    ON dept_courses.course_id = courses.course_id
+    AND courses.course_id = evals.course_id
+    AND courses.course_id = profs.course_id
+    WHERE dept_courses.dept = :dept
+    AND courses.course = :course_name;'''
+
+PROF = '''SELECT {}
+    FROM courses JOIN profs JOIN evals
+    ON courses.course_id = evals.course_id
+    AND courses.course_id = profs.course_id
+    WHERE profs.fn = :prof_fn
+    AND profs.ln = :prof_ln;'''
+
+DEPT = '''SELECT {}
+    FROM dept_courses JOIN courses JOIN profs JOIN evals
+    ON dept_courses.course_id = courses.course_id
+    AND courses.course_id = evals.course_id
+    AND courses.course_id = profs.course_id
+    WHERE dept_courses.dept = :dept;'''
+
+PROF_PRIMARY_DEPT = '''SELECT dept FROM prof_depts
+    WHERE fn = :prof_fn AND ln = :prof_ln;'''
+
+# names is a JSON list of [fn, ln] pairs, so any number of professors can be
+# looked up with the same statement
+PROFS_PRIMARY_DEPTS = '''SELECT prof_depts.fn, prof_depts.ln, prof_depts.dept
+    FROM json_each(:names) AS names JOIN prof_depts
+    ON prof_depts.fn = json_extract(names.value, '$[0]')
+    AND prof_depts.ln = json_extract(names.value, '$[1]');'''
+
+COURSE_NAME_TO_NUM = '''SELECT DISTINCT course_number FROM courses
+    WHERE dept = :dept AND course = :course_name;'''
+
+# 'dept_rank' is built and kept up to date by tosql.py, so a ranking reads
+# one precomputed row per department in the order of an index
+_RANK_DEPTS = '''SELECT dept AS 'Department Code',
+    IFNULL(dept_name, '') AS 'Department Name',
+    ROUND(avg_time, 2) AS 'Average Time',
+    ROUND(prof_score, 2) AS 'Average Professor Score'
+    FROM dept_rank
+    WHERE avg_time > .1 AND num_evals > 10
+    ORDER BY {} DESC;'''
+
+# ORDER BY cannot take a bound parameter, so the column comes from this
+# whitelist and each ranking gets its own fixed statement
+RANK_COLUMNS = ('avg_time', 'prof_score')
+RANK_DEPTS = {column: _RANK_DEPTS.format(column) for column in RANK_COLUMNS}
+
+# Word cloud statements. 'course_term_freqs' holds per-word counts of the
+# course responses of each evaluation, and 'term_freqs' of the instructor
+# responses for each of its instructors (both built by tosql.py), so the word
+# frequencies are summed in sqlite and only the :max_words most common words
+# come back. A course and professor search adds the course counts of the
+# evaluations the professor taught to their instructor counts.
+WC_COURSE_NUM = '''SELECT word, SUM(course_count) AS freq
+    FROM course_term_freqs JOIN courses
+    ON course_term_freqs.course_id = courses.course_id
+    WHERE courses.dept = :dept
+    AND courses.course_number = :course_num
+    GROUP BY word HAVING freq > 0
+    ORDER BY freq DESC LIMIT :max_words;'''
+
+WC_COURSE_NAME = '''SELECT word, SUM(course_count) AS freq
+    FROM course_term_freqs JOIN courses
+    ON course_term_freqs.course_id = courses.course_id
+    WHERE courses.dept = :dept
+    AND courses.course = :course_name
+    GROUP BY word HAVING freq > 0
+    ORDER BY freq DESC LIMIT :max_words;'''
+
+_WC_COURSE_AND_PROF = '''SELECT word, SUM(count) AS freq FROM (
+        SELECT word, course_count AS count
+        FROM course_term_freqs JOIN courses JOIN profs
+        ON course_term_freqs.course_id = courses.course_id
+        AND courses.course_id = profs.course_id
+        WHERE courses.dept = :dept
+        AND courses.{0} = :{1}
+        AND profs.fn = :prof_fn
+        AND profs.ln = :prof_ln
+        UNION ALL
+        SELECT word, inst_count AS count
+        FROM term_freqs JOIN courses
+        ON term_freqs.course_id = courses.course_id
+        WHERE courses.dept = :dept
+        AND courses.{0} = :{1}
+        AND term_freqs.fn = :prof_fn
+        AND term_freqs.ln = :prof_ln)
+    GROUP BY word HAVING freq > 0
+    ORDER BY freq DESC LIMIT :max_words;'''
+
+WC_COURSE_NUM_AND_PROF = _WC_COURSE_AND_PROF.format('course_number', 'course_num')
+
+WC_COURSE_NAME_AND_PROF = _WC_COURSE_AND_PROF.format('course', 'course_name')
+
+WC_PROF = '''SELECT word, SUM(inst_count) AS freq
+    FROM term_freqs
+    WHERE fn = :prof_fn
+    AND ln = :prof_ln
+    GROUP BY word HAVING freq > 0
+    ORDER BY freq DESC LIMIT :max_words;'''
+
+# the most evaluated courses, professors and professors' courses, which
+# warm_wordclouds.py renders word clouds for ahead of time
+TOP_COURSES = '''SELECT courses.dept, courses.course_number
+    FROM courses JOIN evals
+    ON courses.course_id = evals.course_id
+    WHERE courses.dept IS NOT NULL AND courses.course_number IS NOT NULL
+    GROUP BY courses.dept, courses.course_number
+    ORDER BY COUNT(*) DESC LIMIT :n;'''
+
+TOP_PROFS = '''SELECT profs.fn, profs.ln
+    FROM profs JOIN evals
+    ON profs.course_id = evals.course_id
+    WHERE profs.fn IS NOT NULL AND profs.ln IS NOT NULL
+    GROUP BY profs.fn, profs.ln
+    ORDER BY COUNT(*) DESC LIMIT :n;'''
+
+TOP_COURSE_PROFS = '''SELECT courses.dept, courses.course_number, profs.fn, profs.ln
+    FROM courses JOIN profs JOIN evals
+    ON courses.course_id = evals.course_id
+    AND courses.course_id = profs.course_id
+    WHERE courses.dept IS NOT NULL AND courses.course_number IS NOT NULL
+    AND profs.fn IS NOT NULL AND profs.ln IS NOT NULL
+    GROUP BY courses.dept, courses.course_number, profs.fn, profs.ln
+    ORDER BY COUNT(*) DESC LIMIT :n;'''
+
+# Keyword search over the 'text_fts' full text index built by tosql.py, best
+# matches first. :query is an FTS5 query string (see
+# response_search.fts_query); one more row than asked for is fetched to tell
+# whether there is a next page.
+RESPONSE_SEARCH = '''SELECT text_fts.course_id, courses.dept, courses.course_number,
+    courses.course, courses.term, courses.year,
+    (SELECT group_concat(profs.fn || ' ' || profs.ln, ', ') FROM profs
+        WHERE profs.course_id = text_fts.course_id) AS profs,
+    snippet(text_fts, -1, '', '', '...', 16) AS snippet
+    FROM text_fts JOIN courses
+    ON courses.course_id = text_fts.course_id
+    WHERE text_fts MATCH :query
+    ORDER BY text_fts.rank
+    LIMIT :limit OFFSET :offset;'''
+
+def rank_query(rank):
+    '''
+    Returns the department ranking statement for the given rank method.
+    Raises ValueError if rank is not one of RANK_COLUMNS.
+    '''
+    try:
+        return RANK_DEPTS[rank]
+    except KeyError:
+        raise ValueError('Cannot rank departments by {!r}'.format(rank))
+
+
+@functools.lru_cache(maxsize = None)
+def project(query, columns = None):
+    '''
+    Fills in the select list of one of the evaluation queries above.
+    columns is a tuple of keys of EVAL_COLUMNS, or None for every column.
+    The result is cached so the same projection always produces the same
+    SQL text and keeps hitting sqlite's statement cache.
+    '''
+    if columns is None:
+        return query.format(ALL_EVAL_COLUMNS)
+
+    unknown = [c for c in columns if c not in EVAL_COLUMNS]
+    if unknown:
+        raise ValueError('Unknown evaluation columns: {}'.format(', '.join(unknown)))
+
+    select = ', '.join('{} AS {}'.format(EVAL_COLUMNS[c][0], c) for c in columns)
+    return query.format(select)
+
+
+def read_evals(db, query, params = None, columns = None):
+    '''
+    Runs one of the evaluation queries and returns a pandas DataFrame
+    holding only the given columns (every column if columns is None)
+    '''
+    if columns is not None:
+        columns = tuple(columns)
+    return read_df(db, project(query, columns), params)
+
+
+def read_eval_arrays(db, query, params, columns):
+    '''
+    Runs one of the evaluation queries and returns a dictionary mapping each
+    of the given columns to a NumPy array of the dtype in EVAL_COLUMNS
+    '''
+    columns = tuple(columns)
+    rows = read_rows(db, project(query, columns), params)
+    values = zip(*rows) if rows else [()] * len(columns)
+    return {c: np.array(v, dtype = EVAL_COLUMNS[c][1])
+            for c, v in zip(columns, values)}
+
+
+def read_df(db, query, params = None):
+    '''
+    Runs one of the statements above with the given parameters and
+    returns the result as a pandas DataFrame
+
+      - db is a sqlite3 connection
+      - query is a string
+      - params is a dictionary mapping parameter names to values
+    '''
+    return pd.read_sql_query(query, db, params = params or {})
+
+
+def read_rows(db, query, params = None):
+    '''
+    Runs one of the statements above and returns the rows as a list of tuples
+    '''
+    return db.execute(query, params or {}).fetchall()
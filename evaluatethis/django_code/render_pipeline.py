@@ -0,0 +1,201 @@
+#-------------------------------------------------------------------------------
+# Name:        render_pipeline
+# Purpose:     Produces everything shown below the results table for a
+#              search: the word cloud, the time graph, the score and
+#              sentiment graphs and the dyadic partitioning sentences. The
+#              database is queried once, up front, and the results are
+#              shared by every renderer. The renders then run at the same
+#              time on a pool of worker processes, so a search takes about
+#              as long as its slowest image. With render_later the page can
+#              be returned before the images exist; they are rendered in the
+#              background and fetched by the page once ready.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/11/2018
+#-------------------------------------------------------------------------------
+
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import courses
+import graphs
+import score_graphs
+import image_cache
+import display_dyadic_partitioning as dyadic
+import gen_wordcloud
+
+# matplotlib and WordCloud hold the GIL while drawing, so the renders only
+# overlap when they run in separate processes
+WORKERS = min(4, os.cpu_count() or 1)
+
+# images shown for a search, in display order, with the function that renders
+# each. Every renderer is called as render(args, data), where data is the word
+# frequencies for 'wordcloud' and the find_courses results for the rest.
+RENDERERS = [('wordcloud', gen_wordcloud.get_wc),
+             ('time', graphs.graph_it),
+             ('score', score_graphs.score_graph),
+             ('sentiment', score_graphs.sentiment_graph)]
+
+# graphs that the search page can draw itself from JSON instead of a PNG
+CHART_KINDS = ('time', 'score', 'sentiment')
+
+# every evaluation column needed by any of the renderers
+COLUMNS = tuple(sorted(set(graphs.COLUMNS) | set(score_graphs.COLUMNS)
+                       | set(dyadic.COLUMNS)))
+
+# The pool is started from a request thread, in a process that has other
+# threads and open sqlite connections. Forking it could copy a lock another
+# thread holds, or a connection, into the workers, so they are started fresh
+# by a fork server (or spawned where there is none) and import what they need.
+START_METHOD = ('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods()
+                else 'spawn')
+
+_executor = None
+_executor_lock = threading.Lock()
+_background = None
+_background_lock = threading.Lock()
+
+
+def get_executor():
+    '''
+    Returns the worker pool, starting it on first use
+    '''
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers = WORKERS,
+                mp_context = multiprocessing.get_context(START_METHOD))
+    return _executor
+
+
+def _renderers(client_charts):
+    '''
+    Returns the entries of RENDERERS that are shipped as PNGs
+    '''
+    if client_charts:
+        return [(kind, render) for kind, render in RENDERERS if kind not in CHART_KINDS]
+    return RENDERERS
+
+
+def image_keys(args, client_charts = False):
+    '''
+    Returns the image cache keys for a search, in display order
+    '''
+    return [image_cache.image_key(kind, args) for kind, _ in _renderers(client_charts)]
+
+
+def chart_data(args, results):
+    '''
+    Returns the data for each of CHART_KINDS as dictionaries for the page to draw
+    '''
+    return [render(args, results, as_json = True)
+            for kind, render in RENDERERS if kind in CHART_KINDS]
+
+
+def _submit(args, results, wanted):
+    '''
+    Submits every image for args whose key is in wanted and that is not
+    cached to the worker pool. Returns a list of (key, future).
+    '''
+    jobs = []
+    for kind, render in RENDERERS:
+        key = image_cache.image_key(kind, args)
+        if key not in wanted:
+            continue
+        if image_cache.get(key) is None:
+            if kind == 'wordcloud':
+                data = gen_wordcloud.get_wc_freqs(args)
+                if not data: # WordCloud cannot draw an empty cloud
+                    continue
+            else:
+                data = results
+            jobs.append((key, get_executor().submit(render, args, data)))
+    return jobs
+
+
+def _collect(jobs):
+    '''
+    Waits for the submitted renders and stores their PNGs in the image cache.
+    The renders are independent, so one that fails is reported and the rest
+    are still stored.
+    '''
+    for key, job in jobs:
+        try:
+            png = job.result() # re-raises any exception from the renderer
+            if not image_cache.exists(key): # get_wc stores its own clouds
+                image_cache.put(key, png)
+        except Exception:
+            print('could not render image {}'.format(key), file = sys.stderr)
+            traceback.print_exc()
+
+
+def render_all(args, client_charts = False):
+    '''
+    Takes a dictionary of search arguments (as for courses.find_courses) and
+    renders every image that is not already cached. If client_charts is True,
+    only the word cloud is rendered and the graphs are returned as data.
+
+    Returns a list of image cache keys in display order (leaving out any
+    image that could not be rendered, such as the word cloud of a course
+    without written responses), the would like and would recommend
+    sentences, and a list of chart dictionaries (empty unless client_charts
+    is True)
+    '''
+    results = courses.find_courses(args, COLUMNS)
+    keys = image_keys(args, client_charts)
+    jobs = _submit(args, results, set(keys))
+    sentences = dyadic.display_dyadic_partitioning(args, results)
+    charts = chart_data(args, results) if client_charts else []
+    _collect(jobs)
+    return [key for key in keys if image_cache.exists(key)], sentences, charts
+
+
+def render_later(args, client_charts = False):
+    '''
+    Like render_all, but returns without waiting for the images. They are
+    rendered by a background thread; use is_pending to tell an image that is
+    still being rendered from one that does not exist. Pending images are
+    marked in the image cache on disk, so a page can fetch them from any
+    server process.
+    '''
+    global _background
+    results = courses.find_courses(args, COLUMNS)
+    sentences = dyadic.display_dyadic_partitioning(args, results)
+    charts = chart_data(args, results) if client_charts else []
+    keys = image_keys(args, client_charts)
+
+    queued = [key for key in keys
+              if image_cache.get(key) is None and image_cache.claim(key)]
+    if queued:
+        with _background_lock:
+            if _background is None:
+                _background = ThreadPoolExecutor(max_workers = WORKERS)
+        _background.submit(_render_queued, args, results, queued)
+
+    return keys, sentences, charts
+
+
+def _render_queued(args, results, keys):
+    '''
+    Renders the images queued by render_later
+    '''
+    try:
+        _collect(_submit(args, results, set(keys)))
+    except Exception:
+        traceback.print_exc()
+    finally:
+        for key in keys:
+            image_cache.release(key)
+
+
+def is_pending(key):
+    '''
+    Returns True if the image stored under key is queued but not rendered
+    yet, by this or any other server process
+    '''
+    return image_cache.is_pending(key)
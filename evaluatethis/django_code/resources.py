@@ -0,0 +1,43 @@
+#-------------------------------------------------------------------------------
+# Name:        resources
+# Purpose:     Loads the lookup tables the website needs (department names
+#              and the department, course and professor lists) once per
+#              process and keeps them in read-only structures, so no request
+#              reads a file to use them. They come from res/ui_lists.pickle,
+#              written by tosql.py, or straight from the database if that
+#              file is missing or belongs to another build of the database.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/12/2018
+#-------------------------------------------------------------------------------
+
+import functools
+from collections import namedtuple
+from types import MappingProxyType
+
+import db_pool
+from res import ui_lists as lists_builder
+
+# dept_names maps department codes to names; depts is a tuple of codes,
+# courses a tuple of (dept, course_num, course_name) and profs a tuple of
+# (fn, ln)
+UILists = namedtuple('UILists', ['dept_names', 'depts', 'courses', 'profs'])
+
+
+@functools.lru_cache(maxsize = None)
+def ui_lists():
+    '''
+    Returns the website's lookup tables as a UILists, loading them on
+    first use. If res/ui_lists.pickle is missing or was built from another
+    version of the database, the lists are built from the database instead.
+    '''
+    lists = lists_builder.read_lists()
+    if lists is None or lists['version'] != db_pool.build_version():
+        with db_pool.connection() as db:
+            lists = lists_builder.build_lists(db)
+
+    return UILists(dept_names = MappingProxyType(lists['dept_names']),
+                   depts = tuple(lists['depts']),
+                   courses = tuple(lists['courses']),
+                   profs = tuple(lists['profs']))
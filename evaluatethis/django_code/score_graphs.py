@@ -10,28 +10,41 @@
 import courses
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-
 import graphs
 
-def df_maker(args_from_ui, sentiment_or_score, graph_type):
+# what each score column is called in graph legends
+LEGEND_NAMES = {'prof_score':'Professor Score', 
+                'ass_score':'Assignment Score', 
+                'test_score':"Test Score", 
+                'over_score':'Overall Score',
+                'inst_sentiment':'Professor sentiment score', 
+                'course_sentiment': "Course sentiment score"}
+
+SCORE_COLUMNS = ('prof_score', 'ass_score', 'over_score', 'test_score',
+                 'inst_sentiment', 'course_sentiment')
+# the score columns plus what get_small_df needs to group and filter by
+COLUMNS = SCORE_COLUMNS + ('course', 'year', 'fn', 'ln')
+
+def df_maker(args_from_ui, sentiment_or_score, graph_type, results = None):
     '''
     Uses the query functions in courses to get a dataframe corresponding to the user's search, 
     then returns a dataframe reduced by get_small_df that includes the columns required by the
     different possible types of graphs (specified by sentiment_or_score, where the two options
     are "sentiment" or "score"). 
     Depending on the user's input, graph_type can be either "prof" or "course."
+    results may hold what courses.find_courses already returned for args_from_ui.
     '''
+    if results is None:
+        results = courses.find_courses(args_from_ui, COLUMNS)
+
     if graph_type == "prof":
-        prof_df, dept_df, dept = courses.find_courses(args_from_ui)
+        prof_df, dept_df, dept = results
         small_df, year = get_small_df(prof_df, graph_type)
 
 
     if graph_type == "course":
-        course_df, dept_df = courses.find_courses(args_from_ui)
-        course_df['prof_name'] = course_df['fn'].astype('str') + ' ' + course_df['ln']
+        course_df, dept_df = results
+        course_df = course_df.assign(prof_name = course_df['fn'].astype('str') + ' ' + course_df['ln'])
         dept = args_from_ui['dept']
         small_df, year = get_small_df(course_df, graph_type)
     
@@ -44,14 +57,8 @@ def df_maker(args_from_ui, sentiment_or_score, graph_type):
 
     current_columns = list(small_df.columns)
     columns_to_graph = list(set(current_columns).intersection(columns_to_graph))
-    continuous_df = small_df[columns_to_graph]
 
-    compare_to_dept_columns = list(continuous_df.columns)
-    dept_df = dept_df[compare_to_dept_columns].mean()
-    dept_df.rename(index = dept, inplace = True)
-    continuous_df = continuous_df.append(dept_df)
-    
-    return continuous_df
+    return graphs.compare_means([(dept, dept_df)], columns_to_graph, small_df)
 
 def get_small_df(dataframe, prof_or_course):
     '''
@@ -63,27 +70,21 @@ def get_small_df(dataframe, prof_or_course):
     current_year = 2018
     timespan = 15
     if prof_or_course == "prof":
-        while dataframe.course.unique().shape[0] > 10:
-            timespan -= 1
-            if timespan == 1:
-                break
-            dataframe = dataframe[dataframe.year >= current_year - timespan]
-        dataframe = dataframe.groupby(['course']).mean()
+        by = 'course'
+        cutoffs = [current_year - span for span in range(timespan - 1, 1, -1)]
+        # the year after the last cutoff is given if there are still too many bars
+        last = current_year - 1
 
     if prof_or_course == "course":
-        while dataframe.prof_name.unique().shape[0] > 10:
-            if timespan == 1:
-                break
-            timespan -= 1
-            dataframe = dataframe[dataframe.year >= current_year - timespan]
-        dataframe = dataframe.groupby(['prof_name']).mean()
-
+        by = 'prof_name'
+        cutoffs = [current_year - span for span in range(timespan - 1, 0, -1)]
+        last = None
 
+    dataframe, cutoff = graphs.window_means(dataframe, by, cutoffs, graphs.MAX_GROUPS, last)
+    return dataframe, cutoff if cutoff is not None else current_year - timespan
 
-    return dataframe, current_year - timespan
 
-
-def course_and_prof_score_df_maker(args_from_ui):
+def course_and_prof_score_df_maker(args_from_ui, results = None):
     '''
     If the user searches by course and professor, this code will produce a graph that compares the scores 
     for this professor averaged over every time they taught the course, the time demands made by
@@ -94,11 +95,13 @@ def course_and_prof_score_df_maker(args_from_ui):
     prof = args_from_ui['prof_fn'] + " " + args_from_ui['prof_ln']
     course = dept + " " + args_from_ui['course_num']
     course_and_prof =  course + " taught by " + prof
-    course_and_prof_df, dept_df, course_df, prof_df = courses.find_courses(args_from_ui)
-    course_and_prof_df = course_and_prof_df.mean().to_frame()
-    dept_df = dept_df.mean()
-    course_df = course_df.mean()
-    prof_df = prof_df.mean()
+    if results is None:
+        results = courses.find_courses(args_from_ui, SCORE_COLUMNS)
+    course_and_prof_df, dept_df, course_df, prof_df = results
+    course_and_prof_df = course_and_prof_df.mean(numeric_only = True).to_frame()
+    dept_df = dept_df.mean(numeric_only = True)
+    course_df = course_df.mean(numeric_only = True)
+    prof_df = prof_df.mean(numeric_only = True)
     scores_df = pd.concat([course_and_prof_df, dept_df, course_df, prof_df], axis = 1)
     scores_df.columns = [course_and_prof, dept, course, prof]
     scores_df = scores_df.dropna(how = "all", axis = 0)
@@ -125,156 +128,153 @@ def columns_to_graph(scores_df, sentiment_or_score):
 def graph_from_df(continuous_df):
     '''
     Given a dataframe of continuous non-time data, creates a grouped bar graph displaying scores 
-    and sentiment scores for that data. 
-    Different versions of matplotlib require you to switch out "left" for "x" sometimes in 
-    the line that starts with "bar = "
-    The error that will let you know that this is happening is: "bar() missing 1 required positional argument"
+    and sentiment scores for that data. Returns the figure and its axes.
     '''
     colors = ['b', 'g', 'r', 'k', 'm', 'y']
     n = continuous_df.shape[0]
     ind = np.arange(n)
     width = 0.1  
     offset = 0
-    plt.figure(figsize = (20, 7))
+    fig, ax = graphs.new_figure((20, 7))
     bars = []
     for column in continuous_df:
-        bar = plt.bar(left = ind - (offset * width), width=width, height=continuous_df[column], color = colors[offset])
+        bar = ax.bar(ind - (offset * width), continuous_df[column], width, color = colors[offset])
         offset += 1
         bars.append(bar)
     xnames = list(continuous_df.axes[0])
-    plt.xticks(ind, xnames, rotation = 10, fontsize = 10, ha = 'right')
-    legend_contents = list([continuous_df.axes[1]])[0]
-    if "prof_score" in legend_contents:
-        legend = []
-        legend_translator = {'prof_score':'Professor Score', 
-                            'ass_score':'Assignment Score', 
-                            'test_score':"Test Score", 
-                            'over_score':'Overall Score'}
-        for label in legend_contents:
-            legend.append(legend_translator[label])
-        legend_contents = legend
-    if 'inst_sentiment' in legend_contents:
-        legend = []
-        legend_translator = {'inst_sentiment':'Professor sentiment score', 
-                            'course_sentiment': "Course sentiment score"}
-        for label in legend_contents:
-            legend.append(legend_translator[label])
-        legend_contents = legend
-
-    plt.legend(bars, legend_contents)
-    plt.ylim(ymax = 100)
-    return plt
-
-
-def prof_score_graph(args_from_ui):
+    ax.set_xticks(ind)
+    ax.set_xticklabels(xnames, rotation = 10, fontsize = 10, ha = 'right')
+    legend_contents = [LEGEND_NAMES[label] for label in continuous_df.axes[1]]
+
+    ax.legend(bars, legend_contents)
+    ax.set_ylim(top = 100)
+    return fig, ax
+
+
+def finish_graph(continuous_df, title, ylabel, as_json):
+    '''
+    Returns the grouped bar graph of continuous_df with the given title and y axis
+    label as PNG bytes, or as a dictionary from graphs.chart_json if as_json is True
+    '''
+    if as_json:
+        series = [(LEGEND_NAMES[column], continuous_df[column]) for column in continuous_df]
+        return graphs.chart_json('grouped', title, ylabel, list(continuous_df.axes[0]),
+                                 series, ymax = 100)
+    fig, ax = graph_from_df(continuous_df)
+    ax.set_title(title)
+    ax.set_ylabel(ylabel, fontsize = 15)
+    return graphs.save_png(fig)
+
+def prof_score_graph(args_from_ui, results = None, as_json = False):
     '''
     Creates a graph for a professor's scores compared to the department average. 
     '''
-    continuous_df = df_maker(args_from_ui, "score", "prof")
+    continuous_df = df_maker(args_from_ui, "score", "prof", results)
     if 'prof_score' in continuous_df:
             continuous_df = continuous_df.sort_values(by = 'prof_score', axis = 0, ascending = False)
-    plt = graph_from_df(continuous_df)
     prof = args_from_ui['prof_fn'] + " " + args_from_ui['prof_ln']
     title = prof + "'s aggregated scores with dept avg."
-    plt.title(title)
-    plt.ylabel("Aggregated scores from reviews", fontsize = 15)
-    plt.savefig('./static/images/profscore.png')
+    return finish_graph(continuous_df, title, "Aggregated scores from reviews", as_json)
 
-def prof_sentiment_graph(args_from_ui):
+def prof_sentiment_graph(args_from_ui, results = None, as_json = False):
     '''
     Creates a graph for a professor's sentiment scores compared to the department average. 
     '''
-    continuous_df = df_maker(args_from_ui, "sentiment", "prof")
+    continuous_df = df_maker(args_from_ui, "sentiment", "prof", results)
     if 'inst_sentiment' in continuous_df:
             continuous_df = continuous_df.sort_values(by = 'inst_sentiment', axis = 0, ascending = False)
-    plt = graph_from_df(continuous_df)
     prof = args_from_ui['prof_fn'] + " " + args_from_ui['prof_ln']
     title = prof + "'s sentiment scores with dept avg."
-    plt.title(title)
-    plt.ylabel("Sentiment scores from reviews", fontsize = 15)
-    plt.savefig('./static/images/profsent.png')
+    return finish_graph(continuous_df, title, "Sentiment scores from reviews", as_json)
 
-def course_sentiment_graph(args_from_ui):
+def course_sentiment_graph(args_from_ui, results = None, as_json = False):
     '''
     Creates a graph for the sentiment scores for all professors that have taught a
     class compared to the department average. 
     '''
-    continuous_df = df_maker(args_from_ui, "sentiment", "course")
+    continuous_df = df_maker(args_from_ui, "sentiment", "course", results)
     if 'inst_sentiment' in continuous_df:
             continuous_df = continuous_df.sort_values(by = 'inst_sentiment', axis = 0, ascending = False) 
-    plt = graph_from_df(continuous_df)
     course = args_from_ui['dept'] + " " + args_from_ui['course_num']
     title = "Sentiment scores for " + course + " with dept avg."
-    plt.title(title)
-    plt.ylabel("Sentiment scores from reviews", fontsize = 15)
-    plt.savefig('./static/images/coursesent.png')
+    return finish_graph(continuous_df, title, "Sentiment scores from reviews", as_json)
 
-def course_score_graph(args_from_ui):
+def course_score_graph(args_from_ui, results = None, as_json = False):
     '''
     Creates a graph for the scores for all professors that have taught a class compared to
     the department average. 
     '''
-    continuous_df = df_maker(args_from_ui, "score", "course")
+    continuous_df = df_maker(args_from_ui, "score", "course", results)
     if 'prof_score' in continuous_df:
             continuous_df = continuous_df.sort_values(by = 'prof_score', axis = 0, ascending = False)
-    plt = graph_from_df(continuous_df)
     course = args_from_ui['dept'] + " " + args_from_ui['course_num']
     title = "Aggregated scores for " + course + " with dept avg."
-    plt.title(title)
-    plt.ylabel("Aggregated scores from reviews", fontsize = 15)
-    plt.savefig('./static/images/coursescore.png')
+    return finish_graph(continuous_df, title, "Aggregated scores from reviews", as_json)
 
-def course_and_prof_score_graph(args_from_ui):
+def course_and_prof_score_graph(args_from_ui, results = None, as_json = False):
     '''
     Creates a graph for the scores for a specific course taught by a specific professor together with 
     information about that course taught by all professors, all courses taught by that specific professor, 
     and the average overall department scores. 
     '''
-    scores_df = course_and_prof_score_df_maker(args_from_ui)
+    scores_df = course_and_prof_score_df_maker(args_from_ui, results)
     scores_df = columns_to_graph(scores_df, 'score')
-    plt = graph_from_df(scores_df)
     prof = args_from_ui['prof_fn'] + ' ' + args_from_ui['prof_ln']
     dept = args_from_ui['dept']
     course = dept + ' ' + args_from_ui['course_num']
     title = "Scores for " + prof + "'s " + course + ' with scores from dept and past classes'
-    plt.title(title)
-    plt.ylabel("Aggregated scores from evaluations", fontsize = 15)
-    plt.savefig('./static/images/courseprofscore.png')
+    return finish_graph(scores_df, title, "Aggregated scores from evaluations", as_json)
 
-def course_and_prof_sentiment_graph(args_from_ui):
+def course_and_prof_sentiment_graph(args_from_ui, results = None, as_json = False):
     '''
     Creates a graph for the sentiment scores for a specific course taught by a specific professor together with 
     information about that course taught by all professors, all courses taught by that specific professor, 
     and the average overall department scores. 
     '''
-    scores_df = course_and_prof_score_df_maker(args_from_ui)
+    scores_df = course_and_prof_score_df_maker(args_from_ui, results)
     scores_df = columns_to_graph(scores_df, 'sentiment')
-    plt = graph_from_df(scores_df)
     prof = args_from_ui['prof_fn'] + ' ' + args_from_ui['prof_ln']
     dept = args_from_ui['dept']
     course = dept + ' ' + args_from_ui['course_num']
     title = "Sentiment scores for " + prof + "'s " + course + ' with scores from dept and past classes'
-    plt.title(title)
-    plt.ylabel("Aggregated scores from evaluations", fontsize = 15)
-    plt.savefig('./static/images/courseprofsent.png')
+    return finish_graph(scores_df, title, "Aggregated scores from evaluations", as_json)
 
-def non_time_graphs(args_from_ui):
+def score_graph(args_from_ui, results = None, as_json = False):
     '''
-    Given arguments from the user, calls the appropriate graphing function to display the information requested. 
+    Given arguments from the user, calls the appropriate graphing function to create the
+    score graph. Returns the graph as PNG bytes, or as a dictionary if as_json is True.
     '''
     if len(args_from_ui) == 2:
 
         if 'prof_fn' in args_from_ui and 'prof_ln' in args_from_ui:
-            prof_score_graph(args_from_ui)
-            prof_sentiment_graph(args_from_ui)
+            return prof_score_graph(args_from_ui, results, as_json)
 
         elif 'dept' in args_from_ui:
-            course_score_graph(args_from_ui)
-            course_sentiment_graph(args_from_ui)
+            return course_score_graph(args_from_ui, results, as_json)
 
-        
+    else:
+        return course_and_prof_score_graph(args_from_ui, results, as_json)
+
+def sentiment_graph(args_from_ui, results = None, as_json = False):
+    '''
+    Given arguments from the user, calls the appropriate graphing function to create the
+    sentiment score graph. Returns the graph as PNG bytes, or as a dictionary if as_json is True.
+    '''
+    if len(args_from_ui) == 2:
+
+        if 'prof_fn' in args_from_ui and 'prof_ln' in args_from_ui:
+            return prof_sentiment_graph(args_from_ui, results, as_json)
+
+        elif 'dept' in args_from_ui:
+            return course_sentiment_graph(args_from_ui, results, as_json)
 
     else:
-        course_and_prof_score_graph(args_from_ui)
-        course_and_prof_sentiment_graph(args_from_ui)
+        return course_and_prof_sentiment_graph(args_from_ui, results, as_json)
+
+def non_time_graphs(args_from_ui, results = None):
+    '''
+    Given arguments from the user, calls the appropriate graphing functions to display the information requested. 
+    Returns the score and sentiment graphs as PNG bytes.
+    '''
+    return score_graph(args_from_ui, results), sentiment_graph(args_from_ui, results)
 
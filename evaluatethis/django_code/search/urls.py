@@ -4,4 +4,8 @@ from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('images/<slug:key>.png', views.image, name='image'),
+    path('wordcloud.png', views.wordcloud, name='wordcloud'),
+    path('responses.json', views.responses, name='responses'),
+    path('autocomplete.json', views.suggest, name='autocomplete'),
 ]
@@ -22,67 +22,135 @@ import io
 import pandas as pd
 
 from django.shortcuts import render
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
+from django.conf import settings
 from django import forms
 
 from courses import find_courses
 from course_name_converter import convert_course_name_to_course_num
-from gen_wordcloud import get_wc
-import score_graphs
-from graphs import graph_it
-from display_dyadic_partitioning import display_dyadic_partitioning
+from fuzzy import match_prof
+from response_search import search_responses, PER_PAGE
+import autocomplete
+import image_cache
+import render_pipeline
+import gen_wordcloud
 
 NOPREF_STR = 'No preference'
-RES_DIR = os.path.join(os.path.dirname(__file__), '..', 'res')
 
 TOTAL_NUM_EVALS = 26068 # total number of evaluations in the database
 
-def _load_column(filename, col=0):
-    """Load single column from csv file."""
-    with open(filename) as f:
-        col = list(zip(*csv.reader(f)))[0]
-        return list(col)
+# image URLs are content addresses, so browsers may keep them for a year
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
 
+# the full size word cloud URL holds the search instead, so it may change
+# when the database is rebuilt
+WORDCLOUD_MAX_AGE = 60 * 60
+WORDCLOUD_ARGS = ('dept', 'course_num', 'prof_fn', 'prof_ln')
+# the combinations of WORDCLOUD_ARGS the search page links to
+WORDCLOUD_SEARCHES = ({'dept', 'course_num'}, {'prof_fn', 'prof_ln'}, set(WORDCLOUD_ARGS))
 
-def _load_res_column(filename, col=0):
-    """Load column from resource directory."""
-    return _load_column(os.path.join(RES_DIR, filename), col=col)
-
+RANK_METHOD = [('', NOPREF_STR), ('avg_time', 'Average Time Spent'),
+              ('prof_score', 'Average Professor Score')]
 
-def _build_dropdown(options):
-    """Convert a list to (value, caption) tuples."""
-    return [(x, x) if x is not None else ('', NOPREF_STR) for x in options]
+# suggestions are fetched from the autocomplete view while the user types,
+# so the page does not carry every department, course and professor
+AUTOCOMPLETE_MAX_AGE = 60 * 60
 
 
-DEPTS = _build_dropdown([None] + _load_res_column('dept_list.csv'))
-COURSE_NUMS = _build_dropdown([None] + _load_res_column('course_num_list.csv'))
-COURSE_NAMES = _build_dropdown([None] + _load_res_column('course_name_list.csv'))
-PROFS_FN = _build_dropdown([None] + _load_res_column('prof_fn_list.csv'))
-PROFS_LN = _build_dropdown([None] + _load_res_column('prof_ln_list.csv'))
-RANK_METHOD = [('', NOPREF_STR), ('avg_time', 'Average Time Spent'),
-              ('prof_score', 'Average Professor Score')]
+def _typeahead(kind):
+    """Text input that asks the autocomplete view for suggestions of kind."""
+    return forms.TextInput(attrs={'data-kind': kind, 'autocomplete': 'off'})
 
 
 class SearchForm_course(forms.Form):
-    dept = forms.ChoiceField(label='Department', choices=DEPTS, required=False)
-    course_num = forms.ChoiceField(label='Course Number', choices=COURSE_NUMS, required=False)
-    course_name = forms.ChoiceField(label='Course Name', choices=COURSE_NAMES, required=False)
+    dept = forms.CharField(label='Department', max_length=100, required=False,
+                           widget=_typeahead('dept'))
+    course_num = forms.CharField(label='Course Number', max_length=100, required=False,
+                                 widget=_typeahead('course'))
+    course_name = forms.CharField(label='Course Name', max_length=200, required=False,
+                                  widget=_typeahead('course'))
+
+    def clean_dept(self):
+        # department codes are stored in upper case, and the field can be
+        # typed in rather than picked from the suggestions
+        return self.cleaned_data['dept'].upper()
 
 
 class SearchForm_prof(forms.Form):
-    prof_fn = forms.ChoiceField(label='Professor\'s First Name', choices=PROFS_FN, required=False)
-    prof_ln = forms.ChoiceField(label='Professor\'s Last Name', choices=PROFS_LN, required=False)
+    prof_fn = forms.CharField(label='Professor\'s First Name', max_length=100, required=False,
+                              widget=_typeahead('prof'))
+    prof_ln = forms.CharField(label='Professor\'s Last Name', max_length=100, required=False,
+                              widget=_typeahead('prof'))
 
 
 class SearchForm_rank(forms.Form):
     rank = forms.ChoiceField(label='Rank Method', choices=RANK_METHOD, required=False)
 
 
-def home(request):
-    # remove the word cloud and graph images after displaying them on the website
-    for file in os.listdir(os.path.join(os.path.dirname(__file__), '..', 'static', 'images')):
-        if file.endswith(".png"):
-            os.remove(os.path.join(os.path.dirname(__file__), '..', 'static', 'images', file))
+def image(request, key):
+    # serve a rendered word cloud or graph from the image cache
+    png = image_cache.get(key)
+    if png is None:
+        if render_pipeline.is_pending(key):
+            # still rendering, the page will ask again
+            response = HttpResponse(status=202)
+            response['Retry-After'] = '1'
+            patch_cache_control(response, no_store=True)
+            return response
+        # the render may have finished since the first look
+        png = image_cache.get(key)
+        if png is None:
+            raise Http404('No such image')
+    response = HttpResponse(png, content_type='image/png')
+    patch_cache_control(response, public=True, max_age=IMAGE_MAX_AGE, immutable=True)
+    return response
+
 
+def wordcloud(request):
+    # render (or load) the full size word cloud for the search in the query string
+    args = {arg: request.GET[arg] for arg in WORDCLOUD_ARGS if request.GET.get(arg)}
+    if set(args) not in WORDCLOUD_SEARCHES:
+        return HttpResponseBadRequest('Search by department and course number, '
+                                      'professor, or both')
+    try:
+        png = gen_wordcloud.get_wc(args, resolution='high')
+    except ValueError:
+        # no responses to draw a cloud from
+        raise Http404('No word cloud for this search')
+    response = HttpResponse(png, content_type='image/png')
+    patch_cache_control(response, public=True, max_age=WORDCLOUD_MAX_AGE)
+    return response
+
+
+def responses(request):
+    # find evaluations by keywords in their written responses, one page at a time
+    keywords = request.GET.get('q', '')
+    try:
+        page = int(request.GET.get('page', 1))
+        per_page = int(request.GET.get('per_page', PER_PAGE))
+        found = search_responses(keywords, page, per_page)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    found['query'] = keywords
+    return JsonResponse(found)
+
+
+def suggest(request):
+    # departments, courses and professors starting with what the user typed
+    try:
+        limit = int(request.GET.get('limit', autocomplete.LIMIT))
+        found = autocomplete.suggest(request.GET.get('q', ''),
+                                     request.GET.get('kind') or None, limit)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    response = JsonResponse({'results': found})
+    patch_cache_control(response, public=True, max_age=AUTOCOMPLETE_MAX_AGE)
+    return response
+
+
+def home(request):
     context = {}
     res = None
     if request.method == 'GET':
@@ -109,8 +177,13 @@ def home(request):
             elif data['course_name']:
                 # the code to produce graphs and word clouds uses course numbers
                 # to make things easier, we convert course names to course nums
-                course_num = convert_course_name_to_course_num(data['dept'], data['course_name'])
+                course_num, course_name = convert_course_name_to_course_num(
+                    data['dept'], data['course_name'])
                 args['course_num'] = course_num
+                if course_name is not None and course_name != data['course_name']:
+                    # no course has this name, so the closest one is used instead
+                    context['corrected_course'] = '{} {} ({})'.format(
+                        data['dept'], course_num, course_name)
 
         if form_prof.is_valid():
             data = form_prof.cleaned_data
@@ -119,6 +192,13 @@ def home(request):
                 num_args += 1
             if data['prof_ln']:
                 args['prof_ln'] = data['prof_ln']
+            if data['prof_fn'] and data['prof_ln']:
+                # professors are searched by exact name, so if there is no
+                # professor with this name we use the closest one instead
+                match = match_prof(data['prof_fn'], data['prof_ln'])
+                if match is not None and match != (data['prof_fn'], data['prof_ln']):
+                    args['prof_fn'], args['prof_ln'] = match
+                    context['corrected_prof'] = '{} {}'.format(*match)
         
         if form_rank.is_valid():
             if form_rank.cleaned_data['rank']:
@@ -153,20 +233,19 @@ def home(request):
                     else:
                     # we want to generate word clouds, graphs, and dyadic partitioning results
                         context['rank'] = False
-                        get_wc(args)
-                        graph_it(args)
-                        score_graphs.non_time_graphs(args)
-                        would_like, would_recommend = display_dyadic_partitioning(args)
+                        if getattr(settings, 'SEARCH_ASYNC_IMAGES', False):
+                            render_images = render_pipeline.render_later
+                            context['images_pending'] = True
+                        else:
+                            render_images = render_pipeline.render_all
+                        client_charts = getattr(settings, 'SEARCH_CHART_MODE', 'png') == 'json'
+                        images, (would_like, would_recommend), charts = \
+                            render_images(args, client_charts)
+                        context['images'] = images
+                        context['wordcloud_query'] = urlencode(args)
+                        context['charts'] = charts
                         context['would_like_str'] = would_like
                         context['would_recommend_str'] = would_recommend
-
-                    # specify which images should be displayed in index.html
-                    if 'dept' in args and 'prof_fn' in args:
-                        context['graph_type'] = 'course_and_prof'
-                    elif 'dept' in args and 'course_num' in args:
-                        context['graph_type'] = 'course'
-                    elif 'prof_fn' in args:
-                        context['graph_type'] = 'prof'
                 
                 else:
                     # the search inputs did not result in a valid course or prof
@@ -12,15 +12,29 @@
 
 import pandas as pd
 import sqlite3
+import re
+import time
+from collections import Counter
+from statistics import mode
+from wordcloud import STOPWORDS as WC_STOPWORDS
 import aggregate_numerical_data as agg_num
 from nltk.corpus import stopwords
 import dyadic_partitioning as dy
+from django_code.res import ui_lists
+from django_code.res import eval_snapshot
 
 EVALS_PART_1 = 'evals_json_version_5_part1'
 EVALS_PART_2 = 'evals_json_version_5_part2'
 SQL_DB_PATH = 'reevaluations.db'
-STOPWORDS = stopwords("english") + ['class', 'classes', 'professor', \
-'professors' 'course', 'courses', 'ta', 'tas']
+STOPWORDS = frozenset(stopwords("english") + ['class', 'classes', 'professor', \
+'professors', 'course', 'courses', 'ta', 'tas'])
+# a word, or a word with an apostrophe inside it ("don't", "prof's"); any 
+# other punctuation, wherever it is, splits words
+TOKEN_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+# cleaned text rows written to the database at a time
+TEXT_BATCH_SIZE = 1000
+# the same word pattern WordCloud uses when it splits text itself
+WORD_RE = re.compile(r"\w[\w']*")
 
 def pre_process(sql_db_path, evals_part_1, evals_part_2):
     '''
@@ -137,6 +151,157 @@ def gen_crosslists(j, db):
 
     pass
 
+def gen_dept_courses(db):
+    '''
+    Takes a database object that already has the 'courses' and 'crosslists'
+    tables and creates our 'dept_courses' table, which lists every course_id 
+    that belongs to a department, either because the course is offered 
+    under that department or because it is crosslisted into it. Each 
+    (dept, course_id) pair appears once, so department and course queries 
+    can join on it without returning an evaluation once per crosslist row
+
+      - db is a sqlite3 database object
+
+    Does not return anything, but rather creates the 'dept_courses' table 
+    and the indexes used to join on course_id in our SQL database
+    '''
+
+    db.executescript('''
+        DROP TABLE IF EXISTS dept_courses;
+        CREATE TABLE dept_courses (
+            dept TEXT NOT NULL,
+            course_id TEXT NOT NULL,
+            PRIMARY KEY (dept, course_id)
+        ) WITHOUT ROWID;
+
+        INSERT INTO dept_courses
+            SELECT dept, course_id FROM courses WHERE dept IS NOT NULL
+            UNION
+            SELECT crosslist, course_id FROM crosslists WHERE crosslist IS NOT NULL;
+
+        CREATE INDEX IF NOT EXISTS courses_course_id ON courses (course_id);
+        CREATE INDEX IF NOT EXISTS profs_course_id ON profs (course_id);
+        CREATE INDEX IF NOT EXISTS evals_course_id ON evals (course_id);
+        ''')
+    db.commit()
+
+def gen_prof_depts(db):
+    '''
+    Takes a database object that already has the 'courses' and 'profs' 
+    tables and creates our 'prof_depts' table, which stores the department 
+    each professor most often teaches under, keyed by first and last name. 
+    The website uses it to pick the department a professor is compared to
+
+      - db is a sqlite3 database object
+
+    Does not return anything, but rather creates the 'prof_depts' table 
+    in our SQL database
+    '''
+
+    taught = pd.read_sql_query('SELECT fn, ln, dept FROM profs JOIN courses \
+        ON profs.course_id = courses.course_id \
+        WHERE fn IS NOT NULL AND ln IS NOT NULL;', db)
+
+    primary = taught.groupby(['fn', 'ln'], sort = False)['dept'].agg(lambda d: mode(list(d)))
+
+    db.executescript('''
+        DROP TABLE IF EXISTS prof_depts;
+        CREATE TABLE prof_depts (
+            fn TEXT NOT NULL,
+            ln TEXT NOT NULL,
+            dept TEXT,
+            PRIMARY KEY (fn, ln)
+        ) WITHOUT ROWID;
+        ''')
+    db.executemany('INSERT INTO prof_depts VALUES (?, ?, ?);',
+        [(fn, ln, dept) for (fn, ln), dept in primary.items()])
+    db.commit()
+
+def gen_dept_rank(db):
+    '''
+    Takes a database object that already has the 'courses' and 'evals' 
+    tables and creates our 'dept_rank' table, which holds each 
+    department's full name, number of evaluations, and average time and 
+    professor score, ready for the website's department rankings. A 
+    'dept_names' table holds the names from depts.csv, and a trigger on 
+    'evals' keeps 'dept_rank' up to date as new evaluations are inserted, 
+    so it never has to be rebuilt from scratch. AVG skips NULLs, so the 
+    sum and count of the non-NULL values of each average are kept. The 
+    website opens the database as immutable (see db_pool.py), so 
+    evaluations may only be inserted while it is stopped, followed by 
+    finish_build 
+
+      - db is a sqlite3 database object
+
+    Does not return anything, but rather creates the 'dept_names' and 
+    'dept_rank' tables in our SQL database
+    '''
+
+    db.executescript('''
+        DROP TABLE IF EXISTS dept_names;
+        CREATE TABLE dept_names (
+            dept TEXT PRIMARY KEY,
+            name TEXT NOT NULL
+        ) WITHOUT ROWID;
+        ''')
+    db.executemany('INSERT INTO dept_names VALUES (?, ?);',
+        list(ui_lists.read_dept_names().items()))
+
+    db.executescript('''
+        DROP TABLE IF EXISTS dept_rank;
+        CREATE TABLE dept_rank (
+            dept TEXT PRIMARY KEY,
+            dept_name TEXT,
+            num_evals INTEGER NOT NULL,
+            sum_avg_time REAL NOT NULL,
+            num_avg_time INTEGER NOT NULL,
+            sum_prof_score REAL NOT NULL,
+            num_prof_score INTEGER NOT NULL,
+            avg_time REAL,
+            prof_score REAL
+        ) WITHOUT ROWID;
+
+        INSERT INTO dept_rank
+            SELECT courses.dept, dept_names.name, COUNT(*),
+            TOTAL(evals.avg_time), COUNT(evals.avg_time),
+            TOTAL(evals.prof_score), COUNT(evals.prof_score),
+            AVG(evals.avg_time), AVG(evals.prof_score)
+            FROM courses JOIN evals
+            ON courses.course_id = evals.course_id
+            LEFT JOIN dept_names
+            ON courses.dept = dept_names.dept
+            WHERE courses.dept IS NOT NULL
+            GROUP BY courses.dept;
+
+        CREATE INDEX dept_rank_avg_time ON dept_rank (avg_time);
+        CREATE INDEX dept_rank_prof_score ON dept_rank (prof_score);
+
+        DROP TRIGGER IF EXISTS dept_rank_insert;
+        CREATE TRIGGER dept_rank_insert AFTER INSERT ON evals
+        BEGIN
+            INSERT OR IGNORE INTO dept_rank
+                SELECT courses.dept, dept_names.name, 0, 0, 0, 0, 0, NULL, NULL
+                FROM courses LEFT JOIN dept_names
+                ON courses.dept = dept_names.dept
+                WHERE courses.course_id = NEW.course_id
+                AND courses.dept IS NOT NULL;
+
+            UPDATE dept_rank SET
+                num_evals = num_evals + 1,
+                sum_avg_time = sum_avg_time + IFNULL(NEW.avg_time, 0),
+                num_avg_time = num_avg_time + (NEW.avg_time IS NOT NULL),
+                sum_prof_score = sum_prof_score + IFNULL(NEW.prof_score, 0),
+                num_prof_score = num_prof_score + (NEW.prof_score IS NOT NULL),
+                avg_time = (sum_avg_time + IFNULL(NEW.avg_time, 0))
+                    / NULLIF(num_avg_time + (NEW.avg_time IS NOT NULL), 0),
+                prof_score = (sum_prof_score + IFNULL(NEW.prof_score, 0))
+                    / NULLIF(num_prof_score + (NEW.prof_score IS NOT NULL), 0)
+            WHERE dept IN (SELECT dept FROM courses
+                WHERE course_id = NEW.course_id);
+        END;
+        ''')
+    db.commit()
+
 def gen_evals(j, db):
     '''
     Takes the evaluations pandas dataframe and a database object 
@@ -159,7 +324,7 @@ def gen_evals(j, db):
         eval[5] = row['num_responses']
         eval[6] = row['low_time']
         eval[7] = row['avg_time']
-       eval[8] = row['high_time']
+        eval[8] = row['high_time']
         if type(row['recommend']) == list:
             eval[9] = int(row['recommend'][0])
             eval[10] = int(row['recommend'][1])
@@ -190,12 +355,12 @@ def gen_evals(j, db):
 def gen_text(j, db):
     '''
     Takes the evaluations pandas dataframe and a database object 
-    and first creates our tentative 'text' table. Then, we join this
-    tentative 'text' table with our 'profs' table, joining on course_id,
-    in order to strip professors' first and last names from their evaluation 
-    responses, so as to not have these redundant names in our WordCloud. 
-    Finally, we use this fully cleaned dataframe to create our final 'text'
-    table
+    and creates our 'text' table. Each evaluation's course and instructor 
+    responses are cleaned, stripped of the first and last names of the 
+    course's professors, so as to not have these redundant names in our 
+    WordCloud, and written once for every professor of the course. Rows 
+    are written in batches as they are made, so the cleaned text is never 
+    all held in memory at once
 
       - j is a pandas DataFrame
       - db is a sqlite3 database object
@@ -203,77 +368,254 @@ def gen_text(j, db):
     Does not return anything, but rather creates the 'text' table 
     in our SQL database
     '''
-    fulldf = j #we use this later when creating the final version of the table
+    profs = pd.read_sql_query('SELECT course_id, fn, ln FROM profs;', db)
+    patterns = prof_name_patterns(profs)
+    instructors = {}
+    for course_id, fn, ln in profs.itertuples(index = False):
+        instructors.setdefault(course_id, []).append((fn, ln))
+
+    db.executescript('''
+        DROP TABLE IF EXISTS text;
+        CREATE TABLE text (
+            course_id TEXT,
+            fn TEXT,
+            ln TEXT,
+            course_resp TEXT,
+            inst_resp TEXT
+        );
+        ''')
+
+    batch = []
+    for course_id, course_resps, inst_resps in zip(j.index, \
+        j['course_responses'], j['instructor_responses']):
+        if course_id not in instructors:
+            continue
+        course_resp = clean_responses(course_resps)
+        inst_resp = clean_responses(inst_resps)
+        if course_id in patterns:
+            course_resp = strip_names(patterns[course_id], course_resp)
+            inst_resp = strip_names(patterns[course_id], inst_resp)
+        for fn, ln in instructors[course_id]:
+            batch.append((course_id, fn, ln, course_resp, inst_resp))
+
+        if len(batch) >= TEXT_BATCH_SIZE:
+            db.executemany('INSERT INTO text VALUES (?, ?, ?, ?, ?);', batch)
+            batch = []
+
+    db.executemany('INSERT INTO text VALUES (?, ?, ?, ?, ?);', batch)
+    db.commit()
+
+def clean_responses(responses):
+    '''
+    Takes the list of responses to one evaluation question and returns 
+    them as one lowercase string of words, without punctuation or 
+    STOPWORDS, so we can quickly make a wordcloud later. Returns None if 
+    there are no responses
 
-    j = j[['course_responses', 'instructor_responses']]
+      - responses is a list of strings, or anything else if the question 
+        was not answered
+    '''
+    if type(responses) != list or len(responses) == 0:
+        return None
+    words = TOKEN_RE.findall(' '.join(responses).lower())
+    return ' '.join([word for word in words if word not in STOPWORDS])
 
-    all_responses = []
-    for ind, row in j.iterrows():
-        resps = [ind, None, None]
-        if type(row['course_responses']) == list and len(row['course_responses']) > 0:
-            course_resps = ''
-            for course_resp in row['course_responses']:
-                course_resps += course_resp + ' '
-            resps[1] = course_resps
-        if type(row['instructor_responses']) == list and len(row['instructor_responses']) > 0:
-            inst_resps = ''
-            for inst_resp in row['instructor_responses']:
-                inst_resps += inst_resp + ' '
-            resps[2] = inst_resps
-        allresponses.append(resps)
-
-    alltext = []
-
-    #pre-clean all text responses so we can quickly make a wordcloud later
-    for [ind, courseresp, instresp] in all_responses:
-        text = [ind, None, None]
-        if coureresp != None:
-            resp = courseresp.lower()
-            resp = resp.strip('`~!@#$%^&*)(_+=][}{":;><,.?')
-            resplist = resp.split()
-            resplist = [x for x in resplist if x not in STOPWORDS]
-            resp = (' ').join(resplist)
-            text[1] = resp
-        if instresp != None:
-            resp = instresp.lower()
-            resp = resp.strip('`~!@#$%^&*)(_+=][}{":;><,.?')
-            resplist = resp.split()
-            resplist = [x for x in resplist if x not in STOPWORDS]
-            resp = (' ').join(resplist)
-            text[2] = resp
-        alltext.append(text)
-
-
-
-    alltext = pd.DataFrame(text)
-
-    alltext = alltext.rename(columns = {0 : 'course_id', 1 : 'course_resp', 2 : 'inst_resp'})
-
-    alltext.to_sql('texttentative', con = db, flavor = 'sqlite', index = False)
-
-    #now we begin the process of stripping professor names from the evaluation responses
-
-    finalalltext = pd.read_sql_query('SELECT profs.course_id, profs.fn, profs.ln, \
-        texttentative.course_resp, texttentative.inst_resp FROM profs JOIN texttentative \
-        ON profs.course_id = texttentative.course_id;', db
-
-    for ind, row in toclean.iterrows():
-        if row['fn'] != None:
-            row['fn'] = row['fn'].lower()
-            if row['course_resp'] != None:
-                row['course_resp'] = row['course_resp'].replace(row['fn'], '')
-            if row['inst_resp'] != None:
-                row['inst_resp'] = row['inst_resp'].replace(row['fn'], '')
-        if row['ln'] != None:
-            row['ln'] = row['ln'].lower()
-            if row['course_resp'] != None:
-                row['course_resp'] = row['course_resp'].replace(row['ln'], '')
-            if row['inst_resp'] != None:
-                row['inst_resp'] = row['inst_resp'].replace(row['ln'], '')
-
-    finalalltext.tosql('text', con = db, flavor = 'sqlite', index = False)
-
-    pd.read_sql_query('DROP TABLE texttentative;', db)
+def prof_name_patterns(profs):
+    '''
+    Takes a dataframe with course_id, fn and ln columns and returns a 
+    dictionary mapping each course_id to one compiled regular expression 
+    that matches any of the first or last names of the course's 
+    instructors as whole words, along with a possessive 's. The patterns 
+    run on responses cleaned by clean_responses, so each name is cleaned 
+    the same way first ("Smith-Jones" is matched as "smith jones")
+
+      - profs is a pandas DataFrame
+    '''
+    names = {}
+    for course_id, fn, ln in profs[['course_id', 'fn', 'ln']].itertuples(index = False):
+        for name in (fn, ln):
+            name = clean_responses([name]) if type(name) == str else None
+            if name:
+                names.setdefault(course_id, set()).add(name)
+
+    # longest names first, so that 'anne' is not matched inside 'annette' 
+    # before 'annette' gets a chance
+    return {course_id: re.compile(r"\b(?:{})(?:'s)?\b".format('|'.join(re.escape(name) 
+                for name in sorted(course_names, key = len, reverse = True))))
+            for course_id, course_names in names.items()}
+
+def strip_names(pattern, resp):
+    '''
+    Takes one of the patterns from prof_name_patterns and a cleaned 
+    response (or None) and returns the response with the names removed
+    '''
+    if resp is None:
+        return None
+    return pattern.sub('', resp)
+
+def gen_text_index(j, db):
+    '''
+    Takes the evaluations pandas dataframe and a database object and 
+    creates our 'text_fts' table, an SQLite FTS5 full text index over the 
+    course and instructor responses of every evaluation, so the website 
+    can find evaluations by keyword. The responses are indexed as they 
+    were written, not as cleaned for the 'text' table, so searches for 
+    common words like "the" still match and the snippets shown with the 
+    results are readable
+
+      - j is a pandas DataFrame
+      - db is a sqlite3 database object
+
+    Does not return anything, but rather creates the 'text_fts' table 
+    in our SQL database
+    '''
+
+    db.executescript('''
+        DROP TABLE IF EXISTS text_fts;
+        CREATE VIRTUAL TABLE text_fts USING fts5(
+            course_id UNINDEXED,
+            course_resp,
+            inst_resp
+        );
+        ''')
+
+    rows = ((course_id, join_responses(course_resps), join_responses(inst_resps))
+            for course_id, course_resps, inst_resps in zip(j.index, 
+                j['course_responses'], j['instructor_responses']))
+    db.executemany('INSERT INTO text_fts (course_id, course_resp, inst_resp) VALUES (?, ?, ?);', 
+        (row for row in rows if row[1] is not None or row[2] is not None))
+    db.execute("INSERT INTO text_fts (text_fts) VALUES ('optimize');")
+    db.commit()
+
+def join_responses(responses):
+    '''
+    Takes the list of responses to one evaluation question and returns 
+    them as one string, one response per line, or None if there are no 
+    responses
+
+      - responses is a list of strings, or anything else if the question 
+        was not answered
+    '''
+    if type(responses) != list or len(responses) == 0:
+        return None
+    return '\n'.join(responses)
+
+def stamp_version(db):
+    '''
+    Takes a database object and sets its user_version to the time it was 
+    built, in seconds, so the website can tell whether files built from 
+    the database (like the UI lists) belong to this build
+
+      - db is a sqlite3 database object
+    '''
+    db.execute('PRAGMA user_version = {:d};'.format(int(time.time())))
+    db.commit()
+
+def finish_build(db):
+    '''
+    Takes a database object with every table built and stamps its version 
+    and writes the files the website builds from it. Run it again after 
+    inserting evaluations into a built database, and then restart the 
+    website: it opens the database as immutable, and only notices a 
+    changed database by its version
+
+      - db is a sqlite3 database object
+    '''
+    stamp_version(db)
+    gen_ui_lists(db)
+    gen_eval_snapshot(db)
+
+def gen_ui_lists(db):
+    '''
+    Takes a database object that already has the 'courses' and 'profs' 
+    tables and its version stamped, and writes the department, course 
+    and professor lists that the website suggests to the website's 
+    ui_lists.pickle
+
+      - db is a sqlite3 database object
+    '''
+    ui_lists.write_lists(ui_lists.build_lists(db))
+
+def gen_eval_snapshot(db):
+    '''
+    Takes a database object that already has the 'dept_courses', 'courses', 
+    'profs' and 'evals' tables and its version stamped, and writes every 
+    evaluation joined with its course and professors to the Arrow files 
+    the website memory-maps to answer searches
+
+      - db is a sqlite3 database object
+    '''
+    eval_snapshot.write_snapshot(db)
+
+def count_terms(text):
+    '''
+    Splits a cleaned response string into words the way WordCloud does 
+    (dropping WordCloud's stopwords, one letter words, numbers and 
+    trailing "'s") and returns a Counter of the words
+
+      - text is a string or None
+    '''
+    counts = Counter()
+    if text is None:
+        return counts
+    for word in WORD_RE.findall(text):
+        if word.endswith("'s"):
+            word = word[:-2]
+        if len(word) > 1 and not word.isdigit() and word not in WC_STOPWORDS:
+            counts[word] += 1
+    return counts
+
+def gen_term_freqs(db):
+    '''
+    Takes a database object that already has the 'text' table and creates 
+    our 'course_term_freqs' and 'term_freqs' tables, which hold how many 
+    times each word appears in the course responses of each evaluation, 
+    and in the instructor responses of each evaluation for each of its 
+    instructors. 'text' repeats an evaluation's responses once for every 
+    instructor, so course counts are kept once per evaluation, or a 
+    co-taught course's words would count once per instructor. The website 
+    sums these counts to build a WordCloud, so it never has to load or 
+    split the response text itself
+
+      - db is a sqlite3 database object
+
+    Does not return anything, but rather creates the 'course_term_freqs' 
+    and 'term_freqs' tables in our SQL database
+    '''
+
+    db.executescript('''
+        DROP TABLE IF EXISTS course_term_freqs;
+        CREATE TABLE course_term_freqs (
+            course_id TEXT NOT NULL,
+            word TEXT NOT NULL,
+            course_count INTEGER NOT NULL
+        );
+        DROP TABLE IF EXISTS term_freqs;
+        CREATE TABLE term_freqs (
+            course_id TEXT NOT NULL,
+            fn TEXT,
+            ln TEXT,
+            word TEXT NOT NULL,
+            inst_count INTEGER NOT NULL
+        );
+        ''')
+
+    counted = set()
+    rows = db.execute('SELECT course_id, fn, ln, course_resp, inst_resp FROM text;')
+    for course_id, fn, ln, course_resp, inst_resp in rows.fetchall():
+        if course_id not in counted:
+            counted.add(course_id)
+            db.executemany('INSERT INTO course_term_freqs VALUES (?, ?, ?);',
+                [(course_id, word, count) for word, count in count_terms(course_resp).items()])
+        db.executemany('INSERT INTO term_freqs VALUES (?, ?, ?, ?, ?);',
+            [(course_id, fn, ln, word, count) for word, count in count_terms(inst_resp).items()])
+
+    db.executescript('''
+        CREATE INDEX course_term_freqs_course_id ON course_term_freqs (course_id);
+        CREATE INDEX term_freqs_course_id ON term_freqs (course_id);
+        CREATE INDEX term_freqs_prof ON term_freqs (fn, ln);
+        ''')
+    db.commit()
 
 
 if __name__ == "__main__":
@@ -282,4 +624,10 @@ if __name__ == "__main__":
     gen_profs(j, db)
     gen_crosslists(j, db)
     gen_evals(j, db)
+    gen_dept_courses(db)
+    gen_prof_depts(db)
+    gen_dept_rank(db)
     gen_text(j, db)
+    gen_term_freqs(db)
+    gen_text_index(j, db)
+    finish_build(db)
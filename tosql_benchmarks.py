@@ -0,0 +1,97 @@
+#-------------------------------------------------------------------------------
+# Name:        tosql_benchmarks
+#
+# Purpose:     Timing comparisons for the steps of tosql.py that build our
+#              SQL database. Run from this folder against a built
+#              reevaluations.db:
+#
+#                  python3 tosql_benchmarks.py [name ...]
+#
+#              With no names, every benchmark is run.
+#
+# Author:      Alex Maiorella, Lily Li, Maya Shaked, Sam Hoffman
+#
+# Created:     03/12/2018
+#-------------------------------------------------------------------------------
+
+import sys
+import time
+import sqlite3
+import pandas as pd
+
+import tosql
+
+def timed(f):
+    '''
+    Runs f once and returns its result and how long it took in seconds
+    '''
+    start = time.time()
+    result = f()
+    return result, time.time() - start
+
+def join_and_replace(text, profs):
+    '''
+    Strips professor names the way gen_text used to: join the responses
+    with 'profs' and call str.replace on every row of the join for the
+    row's first and last name
+    '''
+    toclean = profs.merge(text, on = 'course_id')
+    course_resps = []
+    inst_resps = []
+    for ind, row in toclean.iterrows():
+        course_resp = row['course_resp']
+        inst_resp = row['inst_resp']
+        for name in (row['fn'], row['ln']):
+            if name != None:
+                name = name.lower()
+                if course_resp != None:
+                    course_resp = course_resp.replace(name, '')
+                if inst_resp != None:
+                    inst_resp = inst_resp.replace(name, '')
+        course_resps.append(course_resp)
+        inst_resps.append(inst_resp)
+    toclean['course_resp'] = course_resps
+    toclean['inst_resp'] = inst_resps
+    return toclean
+
+def strip_with_patterns(text, profs):
+    '''
+    Strips professor names the way gen_text does: one compiled regex per
+    course, applied once to each response before the join with 'profs'
+    '''
+    patterns = tosql.prof_name_patterns(profs)
+    text = text.copy()
+    for column in ['course_resp', 'inst_resp']:
+        text[column] = [tosql.strip_names(patterns[course_id], resp)
+                        if course_id in patterns else resp
+                        for course_id, resp in zip(text['course_id'], text[column])]
+    return text
+
+def bench_prof_names(db):
+    '''
+    Compares the row by row professor name stripping with one
+    tosql.prof_name_patterns regex per course on every response in the
+    'text' table
+    '''
+    text = pd.read_sql_query('SELECT DISTINCT course_id, course_resp, inst_resp \
+        FROM text;', db)
+    profs = pd.read_sql_query('SELECT course_id, fn, ln FROM profs;', db)
+
+    old, old_s = timed(lambda: join_and_replace(text, profs))
+    new, new_s = timed(lambda: profs.merge(strip_with_patterns(text, profs),
+        on = 'course_id'))
+
+    print('{} responses, {} rows after the join with profs'.format(len(text), len(old)))
+    print('{:<24}{:>10.2f}s'.format('join and replace', old_s))
+    print('{:<24}{:>10.2f}s'.format('prof_name_patterns', new_s))
+
+BENCHMARKS = {
+    'prof_names': bench_prof_names,
+}
+
+if __name__ == "__main__":
+    db = sqlite3.connect(tosql.SQL_DB_PATH)
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print('== {} =='.format(name))
+        BENCHMARKS[name](db)